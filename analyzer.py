@@ -9,10 +9,119 @@ def detect_change(old_hash, new_hash):
     return old_hash != new_hash
 
 from openai import OpenAI
+import os
+import threading
+import time
+import storage
+from latency import LatencyTracker
 
-def summarize_text(text, api_key=None):
+# Point at a local OpenAI-compatible stand-in (e.g. for load tests) with OPENAI_BASE_URL
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT = 60.0  # Seconds per request
+OPENAI_MAX_RETRIES = 2  # SDK-level retries (connection errors, 429, 5xx)
+CHAT_MODEL = "gpt-4o-mini"
+
+# One client (and HTTP connection pool) per API key, reused across calls
+_clients = {}
+_clients_lock = threading.Lock()
+llm_latency = LatencyTracker()  # Keyed by call purpose: summary, master_summary, chat
+_usage = {}
+_usage_lock = threading.Lock()
+
+def get_client(api_key):
+    """Shared OpenAI client for this API key, with central timeout and retry settings."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = OpenAI(api_key=api_key, base_url=OPENAI_BASE_URL,
+                                                timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+        return client
+
+def _record_call(purpose, response=None, failed=False):
+    with _usage_lock:
+        usage = _usage.setdefault(purpose, {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        usage["calls"] += 1
+        if failed:
+            usage["errors"] += 1
+        elif response is not None and getattr(response, 'usage', None):
+            usage["prompt_tokens"] += response.usage.prompt_tokens or 0
+            usage["completion_tokens"] += response.usage.completion_tokens or 0
+
+def chat_completion(api_key, purpose, messages, model=CHAT_MODEL, max_retries=None):
+    """
+    Run a chat completion on the shared client, recording latency and token usage.
+    max_retries overrides OPENAI_MAX_RETRIES (e.g. 0 when the caller retries itself).
+    Returns the message text; raises openai errors.
+    """
+    client = get_client(api_key)
+    if max_retries is not None:
+        client = client.with_options(max_retries=max_retries)  # Shares the connection pool
+    started = time.monotonic()
+    try:
+        response = client.chat.completions.create(model=model, messages=messages)
+    except Exception:
+        llm_latency.observe(purpose, time.monotonic() - started)
+        _record_call(purpose, failed=True)
+        raise
+    llm_latency.observe(purpose, time.monotonic() - started)
+    _record_call(purpose, response)
+    return response.choices[0].message.content
+
+def get_llm_stats():
+    """Per-purpose call counts, errors, token usage and latency histograms."""
+    latency = llm_latency.stats()
+    with _usage_lock:
+        return {purpose: {**usage, "latency": latency.get(purpose)} for purpose, usage in _usage.items()}
+
+# Page summaries are cached by (content_hash, model, prompt version); bump the
+# version whenever the summary prompt changes so stale summaries are not reused.
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_CACHE_TTL = 30 * 24 * 3600
+SUMMARY_CACHE_MAX_ENTRIES = 50000
+SUMMARY_CACHE_EVICT_EVERY = 100  # Inserts between eviction passes
+
+_cache_stats = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+_cache_lock = threading.Lock()
+
+def _count(stat, amount=1):
+    with _cache_lock:
+        _cache_stats[stat] += amount
+        return _cache_stats[stat]
+
+def get_cached_summary(content_hash):
+    """Return the cached summary for this content, or None (counted as hit/miss)."""
+    try:
+        summary = storage.get_cached_summary(content_hash, SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, SUMMARY_CACHE_TTL)
+    except Exception:
+        summary = None  # Cache table missing (storage.init_db not run) or DB busy
+    _count("hits" if summary is not None else "misses")
+    return summary
+
+def cache_summary(content_hash, summary):
+    try:
+        storage.save_cached_summary(content_hash, SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, summary)
+        if _count("stores") % SUMMARY_CACHE_EVICT_EVERY == 0:
+            _count("evicted", storage.evict_summary_cache(SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL))
+    except Exception:
+        pass
+
+def get_summary_cache_stats():
+    with _cache_lock:
+        stats = dict(_cache_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    try:
+        stats["entries"] = storage.get_summary_cache_size()
+    except Exception:
+        stats["entries"] = None
+    return stats
+
+def summarize_text(text, api_key=None, content_hash=None):
     """
     Generate a summary of the text using OpenAI API.
+    Summaries are served from the persistent cache when the same content was
+    summarized before with the current model and prompt.
     """
     if not text:
         return "No content."
@@ -23,18 +132,27 @@ def summarize_text(text, api_key=None):
         word_count = len(text.split())
         return f"Preview: {preview}...\n(Total words: {word_count})\n[Tip: Add OpenAI API Key for AI Summary]"
 
+    content_hash = content_hash or calculate_hash(text)
+    cached = get_cached_summary(content_hash)
+    if cached is not None:
+        return cached
+
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes web page content concisely."},
-                {"role": "user", "content": f"Please provide a concise summary of the following website content:\n\n{text[:10000]}"}
-            ]
-        )
-        return response.choices[0].message.content
+        summary = request_summary(text, api_key)
     except Exception as e:
         return f"AI Summary Failed: {str(e)}"
+    cache_summary(content_hash, summary)
+    return summary
+
+def summary_prompt(text):
+    return f"Please provide a concise summary of the following website content:\n\n{text[:10000]}"
+
+def request_summary(text, api_key, max_retries=None):
+    """Call the LLM for one page summary (no cache); raises openai errors such as RateLimitError."""
+    return chat_completion(api_key, "summary", [
+        {"role": "system", "content": "You are a helpful assistant that summarizes web page content concisely."},
+        {"role": "user", "content": summary_prompt(text)}
+    ], model=SUMMARY_MODEL, max_retries=max_retries)
 
 def generate_master_summary(page_summaries, api_key=None):
     """
@@ -49,18 +167,12 @@ def generate_master_summary(page_summaries, api_key=None):
     combined_text = "\n\n".join(page_summaries)
     
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant. You will be given summaries of multiple pages from a single website. Your job is to create a cohesive 'Master Summary' that describes what this website is about and what information it contains based on these page summaries."},
-                {"role": "user", "content": f"Here are the summaries of the pages on the website:\n\n{combined_text[:15000]}"}
-            ]
-        )
-        return response.choices[0].message.content
+        return chat_completion(api_key, "master_summary", [
+            {"role": "system", "content": "You are a helpful assistant. You will be given summaries of multiple pages from a single website. Your job is to create a cohesive 'Master Summary' that describes what this website is about and what information it contains based on these page summaries."},
+            {"role": "user", "content": f"Here are the summaries of the pages on the website:\n\n{combined_text[:15000]}"}
+        ])
     except Exception as e:
         return f"Master Summary Failed: {str(e)}"
-        return f"Master Summary Failed: {str(e)}"
 
 # Alias for compatibility
 summarize = summarize_text
@@ -73,14 +185,9 @@ def chat_with_content(prompt, api_key):
         return "Error: API Key required for chat."
         
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response.choices[0].message.content
+        return chat_completion(api_key, "chat", [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ])
     except Exception as e:
         return f"Chat Error: {str(e)}"
@@ -1,10 +1,23 @@
 from flask import Flask, render_template, jsonify, request
+import os
+import re
 import threading
 import datetime
 import sqlite3
 import storage
 import scraper
 import analyzer
+import discovery
+import crawl_engine
+import extract_pool
+import llm_pipeline
+import master_summary
+import content_fingerprint
+import diff_engine
+import change_analysis
+import chat_index
+import vector_index
+from job_registry import JobRegistry
 import linkedin_scraper
 import outreach_service
 from scheduler_service import SchedulerService
@@ -17,72 +30,224 @@ OPENAI_API_KEY = None
 # Background Scheduler
 scheduler = SchedulerService()
 
+# Bounded, de-duplicated crawl jobs (one active crawl per root URL)
+crawl_jobs = JobRegistry()
+
+# Pages processed concurrently per crawl (fetch / extract / summarize / save pipeline)
+CRAWL_WORKERS = 4
+MAX_PAGES = 20  # Page budget per crawl
+OFFLOAD_EXTRACTION = True  # Parse pages in worker processes so the dashboard stays responsive
+
+# 'thread' runs crawls inside this process; 'queue' only enqueues them for worker.py processes
+CRAWL_MODE = os.environ.get('CRAWL_MODE', 'thread')
+
 # --- Helpers ---
 def get_all_pages_grouped():
     return storage.get_pages_grouped()
 
-def crawl_and_scrape(start_url, api_key, capture_screenshots=False):
+def crawl_and_scrape(start_url, api_key, capture_screenshots=False, due_only=False, cancel_event=None):
     """
     Recursively crawl and scrape pages starting from start_url.
+    With due_only (scheduled ticks), only pages whose adaptive revisit interval
+    has elapsed are fetched, plus any new pages they link to.
+    Setting cancel_event stops the crawl after the pages in flight.
     Run this in a background thread.
     """
     print(f"Starting crawl for {start_url} (screenshots: {capture_screenshots})")
-    queue = [start_url]
-    visited = set()
-    MAX_PAGES = 20
-
-    while queue and len(visited) < MAX_PAGES:
-        url = queue.pop(0)
-        if url in visited:
-            continue
-        visited.add(url)
-        
-        print(f"Processing: {url}")
-        start_time = datetime.datetime.now().isoformat()
-        html, content_type = scraper.fetch_page(url, render_js=capture_screenshots, save_screenshot=capture_screenshots)
-        
-        if not html:
-            storage.log_scrape_run(start_url, url, start_time, datetime.datetime.now().isoformat(), "failed", 0, False)
-            continue
 
-        text = scraper.extract_text(html, content_type)
-        bytes_fetched = len(html.encode('utf-8'))
-        new_hash = analyzer.calculate_hash(text)
-        
-        summary = analyzer.summarize_text(text, api_key)
-        changed = storage.save_page(url, new_hash, summary, text, root_url=start_url)
-        storage.log_scrape_run(start_url, url, start_time, datetime.datetime.now().isoformat(), "success", bytes_fetched, changed)
-        
-        links = scraper.get_internal_links(url, html, content_type)
-        for link in links:
-            if link not in visited and link not in queue:
-                queue.append(link)
-    
+    last_scraped = storage.get_last_scraped_times(start_url)
+    due_pages = None
+    if due_only and last_scraped:
+        due_pages = storage.get_due_pages(start_url, limit=MAX_PAGES)
+        if not due_pages:
+            print(f"No pages due for {start_url}")
+            return
+        print(f"Revisiting {len(due_pages)} due page(s) for {start_url}")
+    changed_pages = []
+
+    # Full crawls are checkpointed so they survive restarts; revisit ticks are cheap to redo
+    resume = None
+    if due_pages is None:
+        resume = storage.get_crawl_state(start_url)
+        if resume:
+            print(f"Resuming crawl for {start_url} ({len(resume['visited'])} done, {len(resume['queued'])} queued)")
+        else:
+            storage.start_crawl_state(start_url, capture_screenshots)
+
+    # A URL only counts as visited in the checkpoint once its page is saved; pages
+    # waiting for their summary are held back so a crash re-crawls them
+    unsaved, held_visited = set(), []
+    save_lock = threading.Lock()
+
+    def checkpoint(queued, visited):
+        nonlocal held_visited
+        with save_lock:
+            pending = held_visited + visited
+            held_visited = [url for url in pending if url in unsaved]
+            done = [url for url in pending if url not in unsaved]
+        storage.checkpoint_crawl_state(start_url, queued, done)
+
+    def log_skip(url, status):
+        now = datetime.datetime.now().isoformat()
+        storage.log_scrape_run(start_url, url, now, now, status, 0, False)
+
+    def log_failure(page):
+        storage.log_scrape_run(start_url, page.url, page.started_at, datetime.datetime.now().isoformat(), "failed", 0, False)
+
+    # Summaries run on a rate-limited pool so fetching continues while they are in flight;
+    # unchanged pages and mirrors are served from the summary cache
+    summaries = llm_pipeline.SummaryPipeline(api_key)
+
+    def summarize_and_save(page):
+        # Unchanged content (or a tiny edit to a very long page) keeps its summary
+        previous = storage.get_reusable_summary(page.url, page.content_hash, page.simhash, len(page.text.split()))
+        if previous is not None:
+            save(page, previous)
+            return
+        with save_lock:
+            unsaved.add(page.url)
+        summaries.submit(page.text, page.content_hash).add_done_callback(lambda done: save_summarized(page, done))
+
+    def save_summarized(page, done):
+        # Left unsaved (the stored page keeps its previous summary) so the next crawl retries it
+        if isinstance(done.exception(), llm_pipeline.DeadlineExceeded):
+            print(f"Summarization deadline passed; not saving {page.url}")
+            with save_lock:
+                unsaved.discard(page.url)
+            log_skip(page.url, "skipped: summarization deadline")
+            return
+        if done.exception() is not None:
+            print(f"Error summarizing {page.url}: {done.exception()}")
+            with save_lock:
+                unsaved.discard(page.url)
+            log_failure(page)
+            return
+        save(page, done.result())
+
+    def save(page, summary):
+        page.data['summary'] = summary
+        try:
+            changed = storage.save_page(page.url, page.content_hash, summary, page.text, root_url=start_url,
+                                        simhash=page.simhash)
+            if changed:
+                changed_pages.append(page.url)
+            storage.log_scrape_run(start_url, page.url, page.started_at, datetime.datetime.now().isoformat(), "success", page.bytes_fetched, changed)
+        except Exception as e:
+            print(f"Error saving {page.url}: {e}")
+            log_failure(page)
+        finally:
+            with save_lock:
+                unsaved.discard(page.url)
+
+    def discover_feeds(page):
+        if page.url == start_url:
+            seed_discovered(discovery.discover_from_feeds(start_url, discovery.find_feed_links(page.url, page.html)))
+
+    # Recrawls visit the pages most likely to have changed first, so MAX_PAGES
+    # is spent where changes happen; first crawls stay breadth-first.
+    history = storage.get_page_change_stats(start_url)
+    frontier = crawl_engine.PriorityFrontier(crawl_engine.change_likelihood_scorer(history)) if history else None
+
+    engine = crawl_engine.CrawlEngine(
+        start_url,
+        stages=[summarize_and_save, discover_feeds],
+        frontier=frontier,
+        start_urls=due_pages,
+        resume=resume,
+        extract_pool=extract_pool.get_pool() if OFFLOAD_EXTRACTION else None,
+        cancel_event=cancel_event,
+        volatile_patterns=storage.get_volatile_patterns(start_url),
+        on_checkpoint=checkpoint if due_pages is None else None,
+        max_pages=MAX_PAGES,
+        workers=CRAWL_WORKERS,
+        # Screenshots need the browser; otherwise let the scraper decide per URL
+        render_js=True if capture_screenshots else 'auto',
+        save_screenshot=capture_screenshots,
+        check_circuit=True,
+        respect_robots=True,
+        on_failure=log_failure,
+        on_skip=log_skip
+    )
+
+    # Seed the frontier from sitemaps and skip pages whose lastmod hasn't advanced
+    unchanged = set()
+
+    def seed_discovered(discovered):
+        for link in discovery.order_by_freshness(discovered):
+            if link != start_url and discovery.is_unchanged(discovered[link], last_scraped.get(link)):
+                unchanged.add(link)
+                engine.exclude(link)
+            else:
+                engine.seed([link])
+
+    if due_pages is None:
+        seed_discovered(discovery.discover_from_sitemaps(start_url))
+    else:
+        # Known pages that are not due keep their own schedule
+        for link in last_scraped:
+            engine.exclude(link)
+    engine.run()
+    summaries.join()
+    # Score and summarize this crawl's changes now so viewers read precomputed results
+    analyzed = change_analysis.process_pending(api_key, root_url=start_url)
+    if analyzed:
+        print(f"Analyzed {analyzed} change(s) for {start_url}")
+    if due_pages is None:
+        storage.clear_crawl_state(start_url)
+
+    if unchanged:
+        print(f"Skipped {len(unchanged)} pages unchanged since last scrape (sitemap/feed lastmod)")
+    if engine.cancelled:
+        print(f"Crawl cancelled for {start_url}")
+        return
     print(f"Crawl finished for {start_url}")
     
-    # Generate Master Summary
-    if api_key:
-        print(f"Generating master summary for {start_url}...")
-        grouped = storage.get_pages_grouped()
-        root_data = grouped.get(start_url)
-        
-        if root_data:
-            summaries = [p['summary'] for p in root_data['pages'] if p['summary']]
-            master_summary = analyzer.generate_master_summary(summaries, api_key)
-            storage.save_site_summary(start_url, master_summary)
-            print(f"Master summary saved for {start_url}")
-
-def perform_scrape_job(url, capture_screenshots=False):
-    """Wrapper to run crawl in background."""
-    thread = threading.Thread(target=crawl_and_scrape, args=(url, OPENAI_API_KEY, capture_screenshots))
-    thread.start()
+    # Rebuilt only when page summaries changed; unchanged sections come from the cache
+    if due_pages is None or changed_pages:
+        master_summary.update_master_summary(start_url, api_key)
+
+def enqueue_scrape_job(url, capture_screenshots=False, due_only=False):
+    """Queue a crawl for worker.py processes (CRAWL_MODE=queue)."""
+    if storage.has_active_crawl(url):
+        print(f"Crawl for {url} already queued")
+        return
+    if due_only and storage.get_last_scraped_times(url):
+        due_pages = storage.get_due_pages(url, limit=MAX_PAGES)
+        if due_pages:
+            storage.enqueue_crawl(url, due_pages, capture_screenshots, MAX_PAGES, mode="due")
+            print(f"Queued {len(due_pages)} due page(s) for {url}")
+        return
+    storage.enqueue_crawl(url, None, capture_screenshots, MAX_PAGES)
+    print(f"Queued crawl for {url}")
+
+def perform_scrape_job(url, capture_screenshots=False, due_only=False):
+    """
+    Run a crawl in the background via the job registry.
+    Returns the Job serving the request (an already active crawl of the same
+    root is reused), or None in queue mode.
+    """
+    if CRAWL_MODE == 'queue':
+        enqueue_scrape_job(url, capture_screenshots, due_only)
+        return None
+    api_key = OPENAI_API_KEY
+    return crawl_jobs.submit(
+        url,
+        lambda job: crawl_and_scrape(url, api_key, capture_screenshots, due_only, cancel_event=job.cancel_event),
+        kind='due' if due_only else 'full'
+    )
+
+def resume_interrupted_crawls():
+    """Restart crawls that were checkpointed but never finished (e.g. after a deploy)."""
+    for root_url, capture_screenshots in storage.get_unfinished_crawls().items():
+        print(f"Resuming interrupted crawl for {root_url}")
+        perform_scrape_job(root_url, capture_screenshots)
 
 def reload_schedules():
     """Reload all active schedules from DB."""
     schedules = storage.get_all_schedules()
     for root_url, data in schedules.items():
         if data['active']:
-            scheduler.add_job(root_url, data['val'], data['unit'], lambda u=root_url: perform_scrape_job(u, False))
+            scheduler.add_job(root_url, data['val'], data['unit'], lambda u=root_url: perform_scrape_job(u, False, due_only=True))
         else:
             scheduler.remove_job(root_url)
 
@@ -115,7 +280,7 @@ def api_add_page():
     perform_scrape_job(url, capture_screenshots)
     
     storage.save_schedule(url, interval_val, interval_unit, True)
-    scheduler.add_job(url, interval_val, interval_unit, lambda: perform_scrape_job(url, capture_screenshots))
+    scheduler.add_job(url, interval_val, interval_unit, lambda: perform_scrape_job(url, capture_screenshots, due_only=True))
     
     return jsonify({"success": True, "message": "Started crawling and monitoring..."})
 
@@ -136,7 +301,7 @@ def api_toggle_schedule():
     storage.save_schedule(root_url, current['val'], current['unit'], is_active)
     
     if is_active:
-        scheduler.add_job(root_url, current['val'], current['unit'], lambda: perform_scrape_job(root_url, False))
+        scheduler.add_job(root_url, current['val'], current['unit'], lambda: perform_scrape_job(root_url, False, due_only=True))
     else:
         scheduler.remove_job(root_url)
         
@@ -151,8 +316,45 @@ def api_delete_page():
         
     count = storage.delete_root(root_url)
     scheduler.remove_job(root_url)
+    vector_index.drop_index(root_url)
     return jsonify({"success": True, "message": f"Deleted {count} pages."})
 
+@app.route('/api/volatile-patterns', methods=['GET'])
+def api_get_volatile_patterns():
+    root_url = request.args.get('root_url')
+    if not root_url:
+        return jsonify({"error": "Root URL is required"}), 400
+    return jsonify({
+        "root_url": root_url,
+        **storage.get_volatile_settings(root_url),
+        "defaults": content_fingerprint.DEFAULT_VOLATILE_PATTERNS,
+        "date_patterns": content_fingerprint.DATE_PATTERNS,
+        "simhash_words_per_bit": content_fingerprint.SIMHASH_WORDS_PER_BIT,
+        "simhash_max_threshold": content_fingerprint.SIMHASH_MAX_THRESHOLD
+    })
+
+@app.route('/api/volatile-patterns', methods=['POST'])
+def api_save_volatile_patterns():
+    """
+    Replace a root's volatile patterns (regexes masked before change detection).
+    "mask_dates": true also masks absolute dates and times; omitted, the current setting is kept.
+    """
+    data = request.json
+    root_url = data.get('root_url')
+    patterns = data.get('patterns')
+    if not root_url or not isinstance(patterns, list):
+        return jsonify({"error": "Root URL and a list of patterns are required"}), 400
+    mask_dates = data.get('mask_dates', storage.get_volatile_settings(root_url)["mask_dates"])
+    if not isinstance(mask_dates, bool):
+        return jsonify({"error": "mask_dates must be true or false"}), 400
+    for pattern in patterns:
+        try:
+            re.compile(pattern)
+        except (re.error, TypeError) as e:
+            return jsonify({"error": f"Invalid pattern {pattern!r}: {e}"}), 400
+    storage.save_volatile_patterns(root_url, patterns, mask_dates)
+    return jsonify({"success": True, **storage.get_volatile_settings(root_url)})
+
 @app.route('/api/scrape', methods=['POST'])
 def api_trigger_scrape():
     data = request.json
@@ -160,8 +362,21 @@ def api_trigger_scrape():
     if not url:
         return jsonify({"error": "URL is required"}), 400
         
-    perform_scrape_job(url, False)
-    return jsonify({"success": True, "message": "Scrape triggered in background"})
+    job = perform_scrape_job(url, False)
+    return jsonify({"success": True, "message": "Scrape triggered in background", "job": job.to_dict() if job else None})
+
+@app.route('/api/jobs', methods=['GET'])
+def api_get_jobs():
+    """List crawl jobs (queued, running and recently finished)."""
+    return jsonify(crawl_jobs.jobs())
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    """Cancel a queued crawl job or stop a running one after its in-flight pages."""
+    job = crawl_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
 
 @app.route('/api/history/<path:url>', methods=['GET'])
 def api_get_history(url):
@@ -207,23 +422,12 @@ def api_compare_versions():
         "summary": versions[1][2] or ""
     }
     
-    import difflib
-    d = difflib.HtmlDiff()
-    diff_html = d.make_file(
-        old_version['content'].splitlines(),
-        new_version['content'].splitlines(),
-        fromdesc=f"Version from {old_version['date']}",
-        todesc=f"Current version from {new_version['date']}",
-        context=True,
-        numlines=3
-    )
-    
     return jsonify({
         "success": True,
         "url": url,
         "old_version": old_version,
         "new_version": new_version,
-        "diff_html": diff_html
+        "diff": diff_engine.diff_texts(old_version['content'], new_version['content'])
     })
 
 @app.route('/api/analytics', methods=['GET'])
@@ -237,6 +441,41 @@ def api_get_analytics():
         print(f"Analytics error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/proxies', methods=['GET'])
+def api_get_proxy_stats():
+    """Get proxy pool health statistics."""
+    return jsonify(scraper.get_proxy_stats())
+
+@app.route('/api/circuits', methods=['GET'])
+def api_get_circuit_stats():
+    """Get per-host circuit breaker states."""
+    return jsonify(scraper.get_circuit_stats())
+
+@app.route('/api/queue', methods=['GET'])
+def api_get_queue_stats():
+    """Get crawl work queue statistics (CRAWL_MODE=queue)."""
+    return jsonify({"mode": CRAWL_MODE, **storage.get_queue_stats()})
+
+@app.route('/api/summary-cache', methods=['GET'])
+def api_get_summary_cache_stats():
+    """Get summary cache hit/miss counts and size."""
+    return jsonify({**analyzer.get_summary_cache_stats(), "pipeline": llm_pipeline.get_stats()})
+
+@app.route('/api/llm', methods=['GET'])
+def api_get_llm_stats():
+    """Get OpenAI call counts, token usage and latency per call type."""
+    return jsonify(analyzer.get_llm_stats())
+
+@app.route('/api/politeness', methods=['GET'])
+def api_get_politeness_stats():
+    """Get per-host crawl pacing statistics."""
+    return jsonify(scraper.get_politeness_stats())
+
+@app.route('/api/latency', methods=['GET'])
+def api_get_latency_stats():
+    """Get per-host latency histograms (adaptive timeouts / hedging)."""
+    return jsonify(scraper.get_latency_stats())
+
 @app.route('/api/chat', methods=['POST'])
 def api_chat():
     data = request.json
@@ -257,40 +496,12 @@ def api_chat():
         page_count = cursor.fetchone()[0]
         
         if page_count > 0:
-            cursor.execute('''
-                SELECT p.url, p.summary, p.last_scraped, h.content
-                FROM pages p
-                LEFT JOIN (
-                    SELECT url, content
-                    FROM scrape_history sh1
-                    WHERE scraped_at = (
-                        SELECT MAX(scraped_at)
-                        FROM scrape_history sh2
-                        WHERE sh2.url = sh1.url
-                    )
-                ) h ON p.url = h.url
-                WHERE p.root_url = ?
-                ORDER BY p.last_scraped DESC
-                LIMIT 50
-            ''', (url,))
-            
-            pages = cursor.fetchall()
             conn.close()
-            
-            content_parts.append(f"Website Root: {url}")
-            content_parts.append(f"Total Pages Monitored: {len(pages)}\n")
-            
-            for idx, (page_url, summary, last_scraped, content) in enumerate(pages, 1):
-                content_parts.append(f"Page {idx}:")
-                content_parts.append(f"URL: {page_url}")
-                if summary:
-                    content_parts.append(f"Summary: {summary}")
-                if last_scraped:
-                    content_parts.append(f"Last Scraped: {last_scraped}")
-                if content:
-                    truncated_content = content[:3000]
-                    content_parts.append(f"Content Preview: {truncated_content}")
-                content_parts.append("")
+            # Only the chunks that best match the question, under a token budget
+            try:
+                content_parts.append(chat_index.build_context(url, query))
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
         else:
             cursor.execute('SELECT url, summary, content_hash FROM pages WHERE url = ? LIMIT 1', (url,))
             page = cursor.fetchone()
@@ -309,8 +520,8 @@ WEBSITE DATA:
 {context}
 
 IMPORTANT INSTRUCTIONS:
-1. Pay attention to URLs and page titles to identify the most recent information
-2. If asked about "latest" or "most recent", look for the newest pages or entries
+1. The excerpts are the parts of the site that best match the question, each with its URL and scrape date; excerpts marked "recent page" come from the most recently changed or scraped pages
+2. If asked about "latest", "most recent" or what is new, rely on the "recent page" excerpts and compare scrape dates
 3. Provide specific URLs when referencing pages
 4. If you find relevant information, cite the specific page URL
 5. If you cannot find the answer in the provided data, say so
@@ -325,17 +536,20 @@ Please provide a detailed answer based on the website data above."""
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/changes', methods=['GET'])
+def api_changes():
+    """Recent change events with precomputed diff stats, sections, relevance and summary."""
+    root_url = request.args.get('root_url')
+    limit = request.args.get('limit', 50, type=int)
+    min_relevance = request.args.get('min_relevance', type=int)
+    return jsonify(storage.get_change_events(root_url, min(limit, 500), min_relevance))
+
 @app.route('/api/diff', methods=['POST'])
 def api_diff():
     data = request.json
     text1 = data.get('text1', '')
     text2 = data.get('text2', '')
-    
-    import difflib
-    d = difflib.HtmlDiff()
-    diff_html = d.make_table(text1.splitlines(), text2.splitlines())
-    
-    return diff_html, 200, {'Content-Type': 'text/html'}
+    return jsonify(diff_engine.diff_texts(text1, text2))
 
 @app.route('/api/linkedin/login', methods=['POST'])
 def api_linkedin_login():
@@ -492,5 +706,7 @@ def api_send_campaign():
 if __name__ == '__main__':
     storage.init_db()
     reload_schedules()
+    if CRAWL_MODE != 'queue':
+        resume_interrupted_crawls()
     print("Server starting on http://localhost:5000")
     app.run(debug=True, host='127.0.0.1', port=5000, use_reloader=False)
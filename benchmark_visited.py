@@ -0,0 +1,42 @@
+import argparse
+import time
+import tracemalloc
+from visited import FingerprintSet
+
+def make_urls(count):
+    """Realistic-looking crawl URLs (~60 characters each)."""
+    for i in range(count):
+        yield f"https://www.example-store.com/catalog/category-{i % 500}/product-{i}?ref=list"
+
+def measure(name, factory, count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    seen = factory()
+    for url in make_urls(count):
+        seen.add(url)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    hits = sum(1 for url in make_urls(count) if url in seen)
+    lookup = time.perf_counter() - start
+    assert hits == count == len(seen)
+
+    print(f"{name:<16} {current / count:>10.1f} {peak / count:>10.1f} "
+          f"{elapsed / count * 1e6:>10.2f} {lookup / count * 1e6:>10.2f}")
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per URL: set of strings vs FingerprintSet")
+    parser.add_argument("--urls", type=int, default=1000000, help="Number of URLs to insert")
+    args = parser.parse_args()
+
+    print(f"Visited set benchmark with {args.urls:,} URLs")
+    print(f"{'structure':<16} {'bytes/url':>10} {'peak/url':>10} {'add (us)':>10} {'in (us)':>10}")
+    baseline = measure("set[str]", set, args.urls)
+    compact = measure("FingerprintSet", FingerprintSet, args.urls)
+    print(f"FingerprintSet uses {baseline / compact:.1f}x less memory")
+
+if __name__ == "__main__":
+    main()
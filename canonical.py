@@ -0,0 +1,68 @@
+"""
+URL canonicalization.
+Collapses the many spellings of one page (/a, /a/, /a?utm_source=x, /a?b=1&a=2,
+www. versus the bare host) into a single URL before it reaches the frontier,
+and reads <link rel="canonical"> so the crawler can skip known duplicates.
+"""
+
+from urllib.parse import urlparse, urlunparse, urljoin, parse_qsl, urlencode
+from bs4 import BeautifulSoup
+
+STRIP_TRACKING_PARAMS = True
+SORT_QUERY = True
+STRIP_TRAILING_SLASH = True
+NORMALIZE_WWW = True  # Treat www.host and host as the same site (the crawl root's spelling wins)
+
+TRACKING_PARAMS = {
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', '_hsenc', '_hsmi', 'ref_src', 'spm', 'cmpid'
+}
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+def _strip_www(host):
+    return host[4:] if host.startswith('www.') else host
+
+def canonicalize(url, host=None):
+    """
+    Return the canonical form of an absolute URL.
+    host: the crawl root's netloc; a www/bare variant of it is rewritten to match.
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or '').lower()
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{parsed.port}"
+    if NORMALIZE_WWW and host and _strip_www(netloc) == _strip_www(host.lower()):
+        netloc = host.lower()
+
+    path = parsed.path or '/'
+    if STRIP_TRAILING_SLASH and len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+
+    params = parse_qsl(parsed.query, keep_blank_values=True)
+    if STRIP_TRACKING_PARAMS:
+        params = [(k, v) for k, v in params if not is_tracking_param(k)]
+    if SORT_QUERY:
+        params.sort()
+    query = urlencode(params, doseq=True) if params else ''
+
+    return urlunparse((scheme, netloc, path, parsed.params, query, ''))
+
+def find_canonical(url, html):
+    """Return the page's canonicalized <link rel="canonical"> target on the same site, or None."""
+    if not html or 'canonical' not in html:
+        return None
+    soup = BeautifulSoup(html, 'html.parser')
+    for link in soup.find_all('link', href=True):
+        if 'canonical' in [rel.lower() for rel in (link.get('rel') or [])]:
+            target = urljoin(url, link['href'].strip())
+            host = urlparse(url).netloc
+            if _strip_www(urlparse(target).netloc.lower()) != _strip_www(host.lower()):
+                return None
+            return canonicalize(target, host)
+    return None
@@ -0,0 +1,154 @@
+"""
+Precomputed change analysis.
+save_page() queues a change event ('pending') with the two scrape_history
+rows it compares; process_pending() runs after a crawl (or worker task) and
+stores the diff stats, the changed sections, a relevance score and a
+summary on the event, so dashboards and n8n read results instead of
+re-diffing raw history. With an API key, relevant changes get an LLM summary
+of only the changed lines.
+"""
+
+import math
+import storage
+import analyzer
+import diff_engine
+import content_fingerprint
+
+TOP_OF_PAGE = 0.2  # Changes in the first 20% of the page weigh most
+BOTTOM_OF_PAGE = 0.8  # ...and changes only in the last 20% (footers) least
+LOCATION_WEIGHTS = {"top": 1.0, "middle": 0.8, "bottom": 0.5}
+FULL_SCORE_FRACTION = 0.2  # Share of lines changed that earns the maximum size score
+FULL_SCORE_LINES = 50  # Lines changed that earn the maximum size score regardless of page size
+MAX_HEADING_CHARS = 80
+MAX_HEADING_WORDS = 10
+MAX_SECTIONS = 20
+DIFF_SUMMARY_MIN_RELEVANCE = 3  # Smaller changes are described without an LLM call
+DIFF_SUMMARY_CHARS = 6000  # Changed lines sent to the LLM
+BATCH_SIZE = 10
+
+def _is_heading(line):
+    line = line.strip()
+    return (2 < len(line) <= MAX_HEADING_CHARS and len(line.split()) <= MAX_HEADING_WORDS
+            and line[-1] not in '.,;:!?')
+
+def _section_for(lines, index):
+    """Nearest heading-like line at or above index (0-based), or None."""
+    for i in range(min(index, len(lines) - 1), -1, -1):
+        if _is_heading(lines[i]):
+            return lines[i].strip()
+    return None
+
+def changed_sections(diff, new_lines):
+    """One entry per hunk: where it is, its size and the heading it falls under."""
+    sections = []
+    for hunk in diff["hunks"][:MAX_SECTIONS]:
+        added = sum(1 for op, _ in hunk["lines"] if op == "+")
+        removed = sum(1 for op, _ in hunk["lines"] if op == "-")
+        first_change = next(i for i, (op, _) in enumerate(hunk["lines"]) if op != " ")
+        position = hunk["new_start"] - 1 + first_change
+        sections.append({
+            "heading": _section_for(new_lines, position),
+            "new_line": position + 1,
+            "position": round(position / max(1, len(new_lines)), 3),
+            "added": added,
+            "removed": removed
+        })
+    return sections
+
+def _location(sections):
+    if not sections:
+        return "middle"
+    first = min(section["position"] for section in sections)
+    if first < TOP_OF_PAGE:
+        return "top"
+    return "bottom" if first >= BOTTOM_OF_PAGE else "middle"
+
+def relevance_score(stats, sections):
+    """
+    1-10 score from the size of the change (share of the page and absolute
+    lines, on a square-root curve) weighted by where on the page it starts.
+    """
+    changed = stats["added"] + stats["removed"]
+    if not changed:
+        return 1
+    total = stats["unchanged"] + max(stats["added"], stats["removed"])
+    size = max(min(1.0, changed / max(1, total) / FULL_SCORE_FRACTION), min(1.0, changed / FULL_SCORE_LINES))
+    score = 10 * math.sqrt(size) * LOCATION_WEIGHTS[_location(sections)]
+    return max(1, min(10, round(score)))
+
+def describe(stats, sections):
+    """Short, LLM-free description of a change."""
+    headings = []
+    for section in sections:
+        if section["heading"] and section["heading"] not in headings:
+            headings.append(section["heading"])
+    text = f"+{stats['added']} / -{stats['removed']} lines"
+    if headings:
+        text += " in " + ", ".join(headings[:5]) + (" and more" if len(headings) > 5 else "")
+    return text
+
+def changed_lines_text(diff, limit=DIFF_SUMMARY_CHARS):
+    lines, size = [], 0
+    for hunk in diff["hunks"]:
+        for op, line in hunk["lines"]:
+            if op == " ":
+                continue
+            entry = f"{op} {line}"
+            if size + len(entry) > limit:
+                return "\n".join(lines)
+            lines.append(entry)
+            size += len(entry) + 1
+    return "\n".join(lines)
+
+def summarize_diff(diff, api_key):
+    """LLM summary of only the added/removed lines; raises openai errors."""
+    return analyzer.chat_completion(api_key, "diff_summary", [
+        {"role": "system", "content": "You are a helpful assistant that explains website changes. You will be given the lines removed (-) and added (+) on a web page. Describe in one or two sentences what changed and why it might matter."},
+        {"role": "user", "content": changed_lines_text(diff)}
+    ])
+
+def analyze_change(old_text, new_text, api_key=None, volatile_patterns=None):
+    """
+    Diff two versions and return the fields stored on a change event.
+    Lines are compared after fingerprint normalization, so timestamps and
+    other masked fragments do not count as changes.
+    """
+    new_lines = (new_text or "").splitlines()
+    diff = diff_engine.diff_lines((old_text or "").splitlines(), new_lines,
+                                  key=lambda line: content_fingerprint.normalize(line, volatile_patterns))
+    sections = changed_sections(diff, new_lines)
+    score = relevance_score(diff["stats"], sections)
+    summary = describe(diff["stats"], sections)
+    if api_key and score >= DIFF_SUMMARY_MIN_RELEVANCE:
+        try:
+            summary = summarize_diff(diff, api_key)
+        except Exception as e:
+            print(f"Diff summary failed, using stats: {e}")
+    return {
+        "relevance_score": score,
+        "diff_summary": summary,
+        "lines_added": diff["stats"]["added"],
+        "lines_removed": diff["stats"]["removed"],
+        "changed_sections": sections
+    }
+
+def process_pending(api_key=None, root_url=None, batch_size=BATCH_SIZE):
+    """Analyze queued change events (optionally for one root). Returns how many were processed."""
+    processed = 0
+    while True:
+        events = storage.claim_change_events(root_url, limit=batch_size)
+        if not events:
+            return processed
+        patterns = {}
+        for event in events:
+            try:
+                if event["root_url"] not in patterns:
+                    patterns[event["root_url"]] = storage.get_volatile_patterns(event["root_url"])
+                result = analyze_change(event["old_content"], event["new_content"], api_key,
+                                        patterns[event["root_url"]])
+                storage.complete_change_event(event["id"], **result)
+            except Exception as e:
+                print(f"Change analysis failed for {event['page_url']}: {e}")
+                storage.complete_change_event(event["id"], 5, "Content changed", None, None, [],
+                                              status=storage.CHANGE_FAILED)
+            processed += 1
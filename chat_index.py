@@ -0,0 +1,282 @@
+"""
+Chunked retrieval for chat.
+Each root gets an in-process BM25 index over chunks of its pages' latest
+content and, with SEMANTIC_SEARCH, a persistent vector_index over the same
+chunks; results are merged by reciprocal rank fusion. Indexes are kept in
+sync incrementally: every lookup compares the pages' content hashes with the
+indexed ones and re-chunks only pages that changed (or drops pages that are
+gone), so changes made by other processes (worker.py) are picked up too.
+build_context() returns the top-ranked chunks that fit a token budget.
+"""
+
+from collections import Counter, OrderedDict
+from contextlib import ExitStack
+import math
+import re
+import threading
+import storage
+import vector_index
+
+CHUNK_CHARS = 1200  # Target chunk size; chunks break on line boundaries
+TOP_K = 8
+CONTEXT_TOKEN_BUDGET = 3000
+CHARS_PER_TOKEN = 4
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_INDEXES = 16  # Roots kept in memory (least recently used are dropped)
+SEMANTIC_SEARCH = True  # Fuse vector_index (embedding) results with BM25
+RRF_K = 60  # Reciprocal rank fusion damping
+MIN_LEXICAL_HITS = 3  # Fewer BM25 matches than this: fill up with the most recent pages
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i if in into is it its of on or our so that the their them
+then there these they this to was we were what when where which who why will with you your
+""".split())
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+def chunk_text(text, chunk_chars=CHUNK_CHARS):
+    """Split text into chunks of about chunk_chars, on line boundaries (long lines are split)."""
+    chunks, current, size = [], [], 0
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        while len(line) > chunk_chars:
+            split = line.rfind(" ", 0, chunk_chars)
+            split = split if split > 0 else chunk_chars
+            head, line = line[:split], line[split:].strip()
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(head)
+        if current and size + len(line) > chunk_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+class Chunk:
+    __slots__ = ("id", "url", "text", "length", "terms", "last_scraped")
+
+    def __init__(self, chunk_id, url, text, last_scraped=None):
+        self.id = chunk_id
+        self.url = url
+        self.text = text
+        self.last_scraped = last_scraped
+        self.terms = Counter(tokenize(text))
+        self.length = sum(self.terms.values())
+
+class BM25Index:
+    """Incremental BM25 over page chunks; pages are added and removed as a whole."""
+
+    def __init__(self):
+        self._chunks = {}  # chunk id -> Chunk
+        self._page_chunks = {}  # url -> [chunk ids]
+        self._postings = {}  # term -> {chunk id: term frequency}
+        self._total_length = 0
+        self._next_id = 0
+        self.page_hashes = {}  # url -> content_hash of the indexed version
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def remove_page(self, url):
+        for chunk_id in self._page_chunks.pop(url, []):
+            chunk = self._chunks.pop(chunk_id)
+            self._total_length -= chunk.length
+            for term in chunk.terms:
+                postings = self._postings[term]
+                del postings[chunk_id]
+                if not postings:
+                    del self._postings[term]
+        self.page_hashes.pop(url, None)
+
+    def page_chunks(self, url):
+        """A page's chunks in document order."""
+        return [self._chunks[chunk_id] for chunk_id in self._page_chunks.get(url, [])]
+
+    def first_chunks(self):
+        """The first (top of page) chunk of every indexed page."""
+        return [self._chunks[ids[0]] for ids in self._page_chunks.values() if ids]
+
+    def add_page(self, url, chunks, content_hash=None, last_scraped=None):
+        """Index (or re-index) a page's chunks."""
+        self.remove_page(url)
+        ids = []
+        for piece in chunks:
+            chunk = Chunk(self._next_id, url, piece, last_scraped)
+            self._next_id += 1
+            self._chunks[chunk.id] = chunk
+            self._total_length += chunk.length
+            for term, count in chunk.terms.items():
+                self._postings.setdefault(term, {})[chunk.id] = count
+            ids.append(chunk.id)
+        self._page_chunks[url] = ids
+        self.page_hashes[url] = content_hash
+
+    def search(self, query, k=TOP_K):
+        """Top k (score, Chunk) pairs for the query, best first."""
+        if not self._chunks:
+            return []
+        n = len(self._chunks)
+        avg_length = self._total_length / n or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                length = self._chunks[chunk_id].length
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * norm
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self._chunks[chunk_id]) for chunk_id, score in best]
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def _sync(indexes, root_url):
+    """Bring the indexes in line with the pages table; only changed pages are re-chunked."""
+    current = storage.get_page_hashes(root_url)
+    stale = set()
+    for index in indexes:
+        for url in [url for url in index.page_hashes if url not in current]:
+            index.remove_page(url)
+        stale.update(url for url, content_hash in current.items()
+                     if url not in index.page_hashes or index.page_hashes[url] != content_hash)
+    if not stale:
+        return 0
+    contents = storage.get_latest_contents(stale)
+    for url in stale:
+        # Pages without stored content are indexed empty so they aren't retried every lookup
+        page = contents.get(url) or {"content": "", "last_scraped": None}
+        chunks = chunk_text(page["content"])
+        for index in indexes:
+            if url not in index.page_hashes or index.page_hashes[url] != current[url]:
+                index.add_page(url, chunks, current[url], page["last_scraped"])
+    return len(stale)
+
+def get_index(root_url):
+    """The BM25Index for a root (not synced; see get_indexes)."""
+    with _indexes_lock:
+        index = _indexes.get(root_url)
+        if index is None:
+            index = _indexes[root_url] = BM25Index()
+        _indexes.move_to_end(root_url)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+def get_indexes(root_url):
+    """Up-to-date BM25 (and, with SEMANTIC_SEARCH, vector) indexes for a root."""
+    indexes = [get_index(root_url)]
+    if SEMANTIC_SEARCH:
+        indexes.append(vector_index.get_index(root_url))
+    with ExitStack() as stack:
+        for index in indexes:
+            stack.enter_context(index.lock)
+        if _sync(indexes, root_url) and SEMANTIC_SEARCH:
+            indexes[1].flush()
+    return indexes
+
+def fuse(rankings, k=TOP_K):
+    """Reciprocal rank fusion of ranked (score, chunk) lists; chunks match on (url, text)."""
+    scores, chunks = {}, {}
+    for ranking in rankings:
+        for rank, (_, chunk) in enumerate(ranking):
+            key = (chunk.url, chunk.text)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            chunks.setdefault(key, chunk)
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(score, chunks[key]) for key, score in best]
+
+def _search(indexes, query, k):
+    """Fused ranking of the indexes (BM25 first) and the number of BM25 matches."""
+    rankings = []
+    for index in indexes:
+        with index.lock:
+            rankings.append(index.search(query, k))
+    return (fuse(rankings, k) if len(rankings) > 1 else rankings[0]), len(rankings[0])
+
+def search(root_url, query, k=TOP_K):
+    """Best chunks of a root for the query: BM25, fused with vector search when enabled."""
+    return _search(get_indexes(root_url), query, k)[0]
+
+def recent_chunks(index, root_url, k=TOP_K):
+    """
+    Top-of-page chunks of the most recently changed pages, then of the most
+    recently scraped ones, as (0.0, Chunk) pairs.
+    """
+    changed = {url: rank for rank, url in enumerate(storage.get_recently_changed_pages(root_url, k))}
+    with index.lock:
+        chunks = index.first_chunks()
+    chunks.sort(key=lambda chunk: chunk.last_scraped or "", reverse=True)
+    chunks.sort(key=lambda chunk: changed.get(chunk.url, len(changed)))
+    return [(0.0, chunk) for chunk in chunks[:k]]
+
+def with_recent(ranked, recent, k=TOP_K):
+    """Pad a ranking that has too few real matches with recent chunks it lacks."""
+    seen = {(chunk.url, chunk.text) for _, chunk in ranked}
+    extra = [(score, chunk) for score, chunk in recent if (chunk.url, chunk.text) not in seen]
+    return ranked + extra[:max(0, k - len(ranked))]
+
+def select_chunks(ranked, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Take ranked (score, Chunk) pairs in order while they fit the token budget."""
+    selected, budget = [], token_budget * CHARS_PER_TOKEN
+    for score, chunk in ranked:
+        if len(chunk.text) > budget:
+            continue
+        selected.append((score, chunk))
+        budget -= len(chunk.text)
+    return selected
+
+def build_context(root_url, query, k=TOP_K, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Prompt context for a question about a monitored root: the site summary
+    plus the best-matching chunks (with their URLs) under token_budget.
+    """
+    parts = [f"Website Root: {root_url}"]
+    budget = token_budget
+    site_summary = storage.get_site_summary(root_url)
+    if site_summary:
+        site_summary = site_summary[:budget * CHARS_PER_TOKEN // 4]
+        parts.append(f"Site Summary: {site_summary}\n")
+        budget -= len(site_summary) // CHARS_PER_TOKEN
+    indexes = get_indexes(root_url)
+    ranked, lexical_hits = _search(indexes, query, k)
+    if lexical_hits < MIN_LEXICAL_HITS:
+        # Vague questions ("what's new?") match little; recent pages answer them best
+        ranked = with_recent(ranked[:max(lexical_hits, k // 2)], recent_chunks(indexes[0], root_url, k), k)
+    for rank, (score, chunk) in enumerate(select_chunks(ranked, budget), 1):
+        origin = ", recent page" if score == 0.0 else ""  # Filled in by recent_chunks(), not matched
+        parts.append(f"Excerpt {rank} (URL: {chunk.url}, last scraped: {chunk.last_scraped}{origin}):")
+        parts.append(chunk.text)
+        parts.append("")
+    return "\n".join(parts)
+
+def build_text_context(text, query, source="content", k=TOP_K, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Prompt context for a question about one ad-hoc document: the whole text if
+    it fits token_budget, else its best-matching chunks from throwaway indexes.
+    """
+    if len(text) <= token_budget * CHARS_PER_TOKEN:
+        return text
+    chunks = chunk_text(text)
+    indexes = [BM25Index()] + ([vector_index.VectorIndex()] if SEMANTIC_SEARCH else [])
+    for index in indexes:
+        index.add_page(source, chunks)
+    ranked, lexical_hits = _search(indexes, query, k)
+    if lexical_hits < MIN_LEXICAL_HITS:
+        # Nothing specific matched: the start of the document is the best overview
+        ranked = with_recent(ranked[:max(lexical_hits, k // 2)],
+                             [(0.0, chunk) for chunk in indexes[0].page_chunks(source)], k)
+    selected = select_chunks(ranked, token_budget)
+    return "\n\n".join(chunk.text for _, chunk in selected)
@@ -0,0 +1,121 @@
+"""
+Per-host circuit breakers for the fetch layer.
+A host whose requests keep failing is skipped quickly instead of burning a
+full timeout per queued URL; after a cool-down one probe request is let through
+to check whether it has recovered.
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = 5  # Consecutive failures before the circuit opens
+RECOVERY_TIMEOUT = 60  # Seconds before the first recovery probe
+MAX_RECOVERY_TIMEOUT = 1800  # Cap for the exponential backoff between probes
+
+class CircuitBreaker:
+    """Circuit breaker for a single host."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, recovery_timeout=RECOVERY_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _cooldown(self):
+        return min(self.recovery_timeout * (2 ** max(self.trips - 1, 0)), MAX_RECOVERY_TIMEOUT)
+
+    def is_open(self):
+        """True if requests would currently be rejected (does not change state)."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.time() - self.opened_at < self._cooldown()
+            if self.state == HALF_OPEN:
+                return self.probe_in_flight
+            return False
+
+    def allow_request(self):
+        """Return True if a request may go out; moves OPEN -> HALF_OPEN after the cool-down."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() - self.opened_at >= self._cooldown():
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.trips = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+            self.probe_in_flight = False
+
+    def release_probe(self):
+        """Give back a half-open probe slot without judging the host."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "trips": self.trips,
+                "retry_in": max(0, round(self.opened_at + self._cooldown() - time.time(), 1)) if self.state == OPEN else 0
+            }
+
+class CircuitBreakerRegistry:
+    """Lazily creates one breaker per host."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, recovery_timeout=RECOVERY_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.recovery_timeout)
+            return self._breakers[host]
+
+    def is_open(self, host):
+        return self.get(host).is_open()
+
+    def allow_request(self, host):
+        return self.get(host).allow_request()
+
+    def record_success(self, host):
+        self.get(host).record_success()
+
+    def record_failure(self, host):
+        self.get(host).record_failure()
+
+    def release_probe(self, host):
+        self.get(host).release_probe()
+
+    def stats(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: breaker.to_dict() for host, breaker in breakers.items()}
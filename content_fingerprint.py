@@ -0,0 +1,106 @@
+"""
+Noise-resistant content fingerprints.
+Extracted text is normalized (Unicode, case, whitespace) and volatile
+fragments such as relative dates ("5 minutes ago") and opaque tokens (CSRF
+values, session ids, cache busters) are masked before hashing, so they no
+longer flip the content hash. Absolute dates and times are often real content,
+so masking them (DATE_PATTERNS) is a per-root opt-in; roots can also add their
+own volatile patterns (see storage.get_volatile_patterns). A page counts as changed
+whenever this normalized hash changes. Alongside it a 64-bit SimHash over word
+shingles is computed; it only decides whether a long page's stored summary
+still describes a slightly edited version (see simhash_threshold).
+"""
+
+from functools import lru_cache
+import hashlib
+import re
+import unicodedata
+
+SHINGLE_WORDS = 3
+SIMHASH_BITS = 64
+SIMHASH_WORDS_PER_BIT = 2000  # Words of page text per bit of tolerated SimHash distance
+SIMHASH_MAX_THRESHOLD = 2  # A single edited word moves the SimHash of short pages by 0-3 bits
+MASK = "#"
+NORMALIZATION_VERSION = 2  # Bump when normalize() changes; storage then recomputes stored fingerprints
+
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+DEFAULT_VOLATILE_PATTERNS = [
+    # Relative times: "5 minutes ago", "updated 2 hrs ago", "just now"
+    r"\b\d+\s*(?:s|sec|secs|seconds?|m|min|mins|minutes?|h|hr|hrs|hours?|d|days?|w|wks?|weeks?|mo|months?|y|yrs?|years?)\s+ago\b",
+    r"\b(?:just now|yesterday|today)\b",
+    # Opaque tokens: hex runs of 24+ chars (session ids, asset hashes) and base64-style
+    # runs where letters and digits touch at least twice (CSRF values, nonces);
+    # slugs like "release_notes_2024_edition" or "iphone-15-pro-review" stay content
+    r"\b(?=[a-f]*\d)[0-9a-f]{24,}\b",
+    r"\b(?=(?:[a-z0-9_\-]*?(?:[a-z]\d|\d[a-z])){2})[a-z0-9_\-]{24,}(?:={1,2}|\b)",
+]
+
+# Absolute dates and times, masked only for roots that opt in (storage.save_volatile_patterns)
+DATE_PATTERNS = [
+    # ISO / numeric dates and times: 2024-05-01, 2024-05-01T10:00:00Z, 01/05/2024, 10:42, 10:42:07 pm
+    r"\b\d{4}-\d{2}-\d{2}(?:[t ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:z|[+-]\d{2}:?\d{2})?)?\b",
+    r"\b\d{1,2}/\d{1,2}/\d{2,4}\b|\b\d{1,2}\.\d{1,2}\.\d{4}\b",
+    r"\b\d{1,2}:\d{2}(?::\d{2})?(?:\s?[ap]\.?m\.?)?\b",
+    # Written dates: "May 1, 2024", "1 May 2024"
+    rf"\b{_MONTHS}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}\b",
+    rf"\b\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTHS}\s+\d{{4}}\b",
+]
+
+@lru_cache(maxsize=256)
+def _compile(patterns):
+    return [re.compile(p, re.IGNORECASE) for p in patterns]
+
+def normalize(text, volatile_patterns=None):
+    """
+    Canonical form of extracted text for fingerprinting: NFKC, lower case,
+    volatile fragments masked and whitespace collapsed.
+    volatile_patterns are extra per-root regexes, applied after the defaults.
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    for pattern in _compile(tuple(DEFAULT_VOLATILE_PATTERNS) + tuple(volatile_patterns or ())):
+        text = pattern.sub(MASK, text)
+    return " ".join(text.split())
+
+def _shingles(words, size=SHINGLE_WORDS):
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+def simhash(normalized):
+    """64-bit SimHash of normalized text over word shingles, as a 16-char hex string."""
+    weights = [0] * SIMHASH_BITS
+    for shingle in set(_shingles(normalized.split())):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    result = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            result |= 1 << bit
+    return f"{result:016x}"
+
+def distance(a, b):
+    """Number of differing bits between two hex SimHashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+def fingerprint(text, volatile_patterns=None):
+    """Return (content_hash, simhash) for extracted text."""
+    normalized = normalize(text, volatile_patterns)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest(), simhash(normalized)
+
+def simhash_threshold(word_count):
+    """
+    Max SimHash distance still treated as the same content. 0 (no tolerance)
+    below SIMHASH_WORDS_PER_BIT words, so edits to short and medium pages always count.
+    """
+    return min(SIMHASH_MAX_THRESHOLD, word_count // SIMHASH_WORDS_PER_BIT)
+
+def is_significant_change(old_simhash, new_simhash, word_count=0):
+    """
+    For two versions whose normalized hashes differ: True unless the page is
+    long enough to tolerate some SimHash distance and the SimHashes are within it.
+    """
+    threshold = simhash_threshold(word_count)
+    if not threshold or not old_simhash or not new_simhash:
+        return True
+    return distance(old_simhash, new_simhash) > threshold
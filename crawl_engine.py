@@ -0,0 +1,406 @@
+"""
+Reusable crawl engine.
+All crawl entry points (dashboard, REST API, CLI, MCP server) share this BFS
+loop: a deque plus a compact fingerprint set as frontier (O(1) per URL),
+built-in fetch / extract / link-discovery steps and pluggable per-page stages. Recrawls can swap in a
+PriorityFrontier that visits the pages most likely to have changed first.
+
+With workers > 1 pages are processed by a bounded thread pool. Fetch, extract
+and LLM stages have separate concurrency limits plus a per-host cap, and
+results are committed in dispatch order so the set and order of visited
+pages matches the serial BFS crawl.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import datetime
+import heapq
+import itertools
+import math
+import threading
+import traceback
+import scraper
+import canonical
+import extract_pool
+from visited import FingerprintSet
+
+DEFAULT_CPU_LIMIT = 2
+DEFAULT_LLM_LIMIT = 4
+DEFAULT_PER_HOST_LIMIT = 4
+REORDER_WINDOW = 4  # Pages dispatched ahead per worker while waiting for in-order commit
+CHECKPOINT_EVERY = 5  # Finished URLs between on_checkpoint calls
+
+# Recrawl prioritisation (see change_likelihood_scorer)
+NEW_PAGE_SCORE = 0.5  # Never-scraped pages: as likely as not to hold something new
+PRIOR_HOURS = 168  # One week prior so a page with little history isn't over-trusted
+DEPTH_PENALTY = 0.1  # Score divided by (1 + DEPTH_PENALTY * depth)
+
+def llm_stage(func):
+    """Mark a stage as an LLM call so it runs under the engine's LLM concurrency limit."""
+    func.crawl_resource = 'llm'
+    return func
+
+class Frontier:
+    """
+    FIFO frontier with constant-time membership checks.
+    Seen URLs are kept as 64-bit fingerprints (visited.FingerprintSet) so only
+    queued URLs are held as strings; pass seen=set() for exact membership.
+    """
+
+    def __init__(self, urls=None, seen=None):
+        self._queue = deque()
+        self._seen = seen if seen is not None else FingerprintSet()
+        for url in urls or []:
+            self.push(url)
+
+    def push(self, url, depth=0):
+        """Enqueue a URL unless it was already queued or visited. Returns True if added."""
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+        self._enqueue(url, depth)
+        return True
+
+    def _enqueue(self, url, depth):
+        self._queue.append((url, depth))
+
+    def pop(self):
+        """Return the next (url, depth); depth 0 is a start URL."""
+        return self._queue.popleft()
+
+    def mark_seen(self, url):
+        """Make sure a URL is never enqueued (e.g. known to be unchanged)."""
+        self._seen.add(url)
+
+    def __contains__(self, url):
+        return url in self._seen
+
+    def __len__(self):
+        return len(self._queue)
+
+class PriorityFrontier(Frontier):
+    """
+    Frontier that pops the highest-scoring URL first.
+    scorer(url, depth) returns a number; ties keep insertion (BFS) order.
+    """
+
+    def __init__(self, scorer, urls=None, seen=None):
+        self.scorer = scorer
+        self._counter = itertools.count()
+        super().__init__(seen=seen)
+        self._queue = []
+        for url in urls or []:
+            self.push(url)
+
+    def _enqueue(self, url, depth):
+        heapq.heappush(self._queue, (-self.scorer(url, depth), next(self._counter), url, depth))
+
+    def pop(self):
+        return heapq.heappop(self._queue)[2:]
+
+def change_likelihood_scorer(history, now=None):
+    """
+    Build a scorer that ranks URLs by the probability they changed since the last check.
+
+    history is storage.get_page_change_stats(root_url). Each page is modelled as
+    a Poisson process with rate (changes + 1) / (observed hours + prior), so
+    P(changed) = 1 - exp(-rate * hours since last check). Deeper pages are
+    discounted, pages never scraped get NEW_PAGE_SCORE and the root comes first.
+    """
+    now = now or datetime.datetime.now()
+
+    def hours_since(timestamp):
+        try:
+            return max(0.0, (now - datetime.datetime.fromisoformat(timestamp)).total_seconds() / 3600)
+        except (TypeError, ValueError):
+            return None
+
+    def scorer(url, depth):
+        if depth == 0:
+            return float('inf')
+        stats = history.get(url)
+        elapsed = hours_since(stats["last_checked"]) if stats else None
+        if elapsed is None:
+            probability = NEW_PAGE_SCORE
+        else:
+            observed = hours_since(stats["first_seen"]) or 0.0
+            rate = (stats["changes"] + 1) / (observed + PRIOR_HOURS)
+            probability = 1 - math.exp(-rate * elapsed)
+        return probability / (1 + DEPTH_PENALTY * depth)
+
+    return scorer
+
+class Page:
+    """State for one crawled page, passed through every stage."""
+
+    def __init__(self, url, root_url):
+        self.url = url
+        self.root_url = root_url
+        self.started_at = datetime.datetime.now().isoformat()
+        self.html = None
+        self.content_type = None
+        self.text = None
+        self.content_hash = None  # SHA-256 of the normalized, volatile-masked text
+        self.simhash = None  # Similarity fingerprint (see content_fingerprint)
+        self.canonical_url = None  # <link rel="canonical"> target, if it differs from url
+        self.duplicate_of = None  # Earlier URL in this crawl with identical content (set on commit)
+        self.depth = 0
+        self.links = []
+        self.data = {}  # Free-form stage outputs (summary, changed, ...)
+
+    @property
+    def bytes_fetched(self):
+        return len(self.html.encode('utf-8')) if self.html else 0
+
+class CrawlEngine:
+    """
+    Breadth-first crawler with configurable limits and per-page stages.
+
+    stages: callables taking a Page, run in order after the page is fetched
+        and its text, hash and links are extracted. Wrap LLM calls with llm_stage().
+    on_page(page): called for each successful page, in crawl order, on the
+        thread that called run().
+    on_failure(page): called when a page could not be fetched.
+    on_skip(url, reason): called when a page is skipped without fetching.
+    workers: number of pages processed concurrently (1 = serial).
+    frontier: queue to crawl from (default: FIFO Frontier, i.e. BFS). Pass a
+        PriorityFrontier to spend max_pages on the most promising URLs first.
+    start_urls: URLs to start from instead of root_url (e.g. pages due for a revisit).
+    on_checkpoint(queued, visited): called every checkpoint_every finished URLs
+        (and when run() ends) with the (url, depth) pairs added to the frontier
+        and the URLs finished since the previous call.
+    resume: {"queued": [(url, depth), ...], "visited": [url, ...]} from an
+        interrupted crawl; the crawl continues from there instead of the start URLs.
+    extract_pool: an extract_pool.ExtractPool to parse pages in worker processes
+        instead of on the crawl threads.
+    cancel_event: threading.Event; once set no further URLs are dispatched.
+    volatile_patterns: extra regexes masked before fingerprinting (per-root rules).
+    """
+
+    def __init__(self, root_url, stages=None, max_pages=50, render_js=False, use_proxy=False,
+                 save_screenshot=False, follow_links=True, check_circuit=False, respect_robots=False,
+                 on_page=None, on_failure=None, on_skip=None, workers=1, network_limit=None,
+                 cpu_limit=DEFAULT_CPU_LIMIT, llm_limit=DEFAULT_LLM_LIMIT, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 frontier=None, start_urls=None, on_checkpoint=None, checkpoint_every=CHECKPOINT_EVERY,
+                 resume=None, extract_pool=None, cancel_event=None, volatile_patterns=None):
+        self.root_url = root_url
+        self.stages = list(stages or [])
+        self.max_pages = max_pages
+        self.render_js = render_js
+        self.use_proxy = use_proxy
+        self.save_screenshot = save_screenshot
+        self.follow_links = follow_links
+        self.check_circuit = check_circuit
+        self.respect_robots = respect_robots
+        self.on_page = on_page
+        self.on_failure = on_failure
+        self.on_skip = on_skip
+        self.workers = max(1, workers)
+        self.per_host_limit = per_host_limit
+        self.on_checkpoint = on_checkpoint
+        self.extract_pool = extract_pool
+        self.cancel_event = cancel_event
+        self.volatile_patterns = tuple(volatile_patterns or ())
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.frontier = frontier if frontier is not None else Frontier()
+        self.pages_visited = 0
+        self.pages_crawled = 0
+        self.duplicates = 0
+        self._content_hashes = {}
+        self._queued_delta = []
+        self._visited_delta = []
+        self._since_checkpoint = 0
+
+        if resume:
+            for url in resume["visited"]:
+                self.frontier.mark_seen(url)
+            for url, depth in resume["queued"]:
+                self.frontier.push(url, depth)
+            self.pages_visited = len(resume["visited"])
+        else:
+            for url in start_urls or [root_url]:
+                self._push(url, 0)
+                # Links back to a start URL may spell it differently ("/" vs "")
+                self.frontier.mark_seen(canonical.canonicalize(url, urlparse(url).netloc))
+
+        self._lock = threading.Lock()
+        self._network_slots = threading.BoundedSemaphore(network_limit or self.workers)
+        self._cpu_slots = threading.BoundedSemaphore(cpu_limit)
+        self._llm_slots = threading.BoundedSemaphore(llm_limit)
+        self._host_slots = {}
+
+    def seed(self, urls, depth=1):
+        """Add extra URLs (sitemaps, feeds, ...) to the frontier."""
+        with self._lock:
+            for url in urls:
+                self._push(url, depth)
+
+    def exclude(self, url):
+        """Never visit this URL during the crawl."""
+        with self._lock:
+            self.frontier.mark_seen(url)
+
+    def _push(self, url, depth):
+        """Add a URL to the frontier, remembering it for the next checkpoint. Caller holds the lock."""
+        if self.frontier.push(url, depth) and self.on_checkpoint:
+            self._queued_delta.append((url, depth))
+
+    @property
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def _skip(self, url, reason):
+        if self.on_skip:
+            self.on_skip(url, reason)
+
+    def fetch(self, page):
+        with self._network_slots, self._host_slot(page.url):
+            page.html, page.content_type = scraper.fetch_page(
+                page.url, render_js=self.render_js, use_proxy=self.use_proxy, save_screenshot=self.save_screenshot
+            )
+        return bool(page.html)
+
+    def extract(self, page):
+        result = None
+        if self.extract_pool is not None:
+            # Pool workers do the parsing, so this thread needs no CPU slot
+            try:
+                result = self.extract_pool.extract(page.url, page.html, page.content_type or '', self.follow_links,
+                                                   self.volatile_patterns)
+            except Exception as e:
+                print(f"Extraction pool failed for {page.url}, extracting in-process: {e}")
+        if result is None:
+            with self._cpu_slots:
+                result = extract_pool.extract_page(page.url, page.html, page.content_type or '', self.follow_links,
+                                                   self.volatile_patterns)
+        self._apply_extraction(page, result)
+
+    def _apply_extraction(self, page, result):
+        page.text = result["text"]
+        page.content_hash = result["content_hash"]
+        page.simhash = result["simhash"]
+        page.links = result["links"]
+        if result["canonical_url"] and result["canonical_url"] != page.url:
+            page.canonical_url = result["canonical_url"]
+
+    def process(self, url, depth=0):
+        """Run one URL through fetch, extract and all stages. Returns the Page or None."""
+        if self.check_circuit and scraper.is_circuit_open(url):
+            self._skip(url, "skipped: circuit open")
+            return None
+        if self.respect_robots and not scraper.is_allowed_by_robots(url):
+            self._skip(url, "skipped: robots.txt")
+            return None
+
+        print(f"Processing: {url}")
+        page = Page(url, self.root_url)
+        page.depth = depth
+        if not self.fetch(page):
+            if self.on_failure:
+                self.on_failure(page)
+            return None
+
+        self.extract(page)
+        for stage in self.stages:
+            if getattr(stage, 'crawl_resource', None) == 'llm':
+                with self._llm_slots:
+                    stage(page)
+            else:
+                stage(page)
+        return page
+
+    def _process_safely(self, url, depth):
+        try:
+            return self.process(url, depth)
+        except Exception as e:
+            print(f"Crawl error processing {url}: {e}")
+            traceback.print_exc()
+            return None
+
+    def _commit(self, url, page):
+        """Merge a finished URL into the crawl (always called in dispatch order)."""
+        if page is not None:
+            self.pages_crawled += 1
+            with self._lock:
+                if page.canonical_url:
+                    # The canonical URL holds the same content; don't fetch it again
+                    self.frontier.mark_seen(page.canonical_url)
+                first = self._content_hashes.setdefault(page.content_hash, page.url)
+                if first != page.url:
+                    # Mirror of an earlier page: its links only lead to more mirrors
+                    page.duplicate_of = first
+                    self.duplicates += 1
+                else:
+                    for link in page.links:
+                        self._push(link, page.depth + 1)
+            if self.on_page:
+                self.on_page(page)
+
+        if self.on_checkpoint:
+            with self._lock:
+                self._visited_delta.append(url)
+            self._since_checkpoint += 1
+            if self._since_checkpoint >= self.checkpoint_every:
+                self.checkpoint()
+
+    def checkpoint(self):
+        """Hand frontier changes since the last checkpoint to on_checkpoint."""
+        if not self.on_checkpoint:
+            return
+        with self._lock:
+            queued, self._queued_delta = self._queued_delta, []
+            visited, self._visited_delta = self._visited_delta, []
+        self._since_checkpoint = 0
+        if queued or visited:
+            self.on_checkpoint(queued, visited)
+
+    def _next_url(self):
+        with self._lock:
+            if not len(self.frontier) or self.pages_visited >= self.max_pages or self.cancelled:
+                return None
+            self.pages_visited += 1
+            return self.frontier.pop()
+
+    def run(self):
+        """
+        Crawl until the frontier is empty or max_pages URLs were visited.
+        Returns the number of pages fetched successfully.
+        """
+        if self.workers == 1:
+            while True:
+                item = self._next_url()
+                if item is None:
+                    break
+                self._commit(item[0], self._process_safely(*item))
+            self.checkpoint()
+            return self.pages_crawled
+
+        # With the FIFO frontier, URLs already queued always precede links of
+        # in-flight pages, so dispatching ahead and committing in order
+        # reproduces the serial order. A PriorityFrontier can rank links
+        # committed later above URLs already dispatched, so there the order is
+        # only approximate and look-ahead is limited to one URL per worker.
+        in_flight = deque()
+        window = self.workers * (1 if isinstance(self.frontier, PriorityFrontier) else REORDER_WINDOW)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                while len(in_flight) < window:
+                    item = self._next_url()
+                    if item is None:
+                        break
+                    in_flight.append((item[0], executor.submit(self._process_safely, *item)))
+                if not in_flight:
+                    break
+                url, future = in_flight.popleft()
+                self._commit(url, future.result())
+
+        self.checkpoint()
+        return self.pages_crawled
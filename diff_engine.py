@@ -0,0 +1,282 @@
+"""
+Line diff service.
+Lines are interned to integer ids so every comparison is an int compare.
+Common prefixes/suffixes are trimmed, then patience diff anchors on lines
+that occur exactly once on both sides (longest increasing subsequence) and
+recurses into the gaps. Gaps without unique anchors are diffed with Myers'
+O(ND) algorithm, capped at MAX_EDIT_DISTANCE edits before the gap is
+reported as one replaced block, so two unrelated 1MB versions stay fast.
+
+Results are compact structured hunks (unified-diff style) cached by
+(old_hash, new_hash, context).
+"""
+
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from html import escape
+import threading
+import analyzer
+
+CONTEXT_LINES = 3
+MAX_EDIT_DISTANCE = 2000  # Myers gives up (block replace) beyond this many edits in one gap
+MAX_DIFF_LINES = 5000  # Lines returned across all hunks; the rest is counted but truncated
+CACHE_MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _intern(old_lines, new_lines, key=None):
+    ids = {}
+    if key is not None:
+        old_lines, new_lines = map(key, old_lines), map(key, new_lines)
+    old = [ids.setdefault(line, len(ids)) for line in old_lines]
+    new = [ids.setdefault(line, len(ids)) for line in new_lines]
+    return old, new
+
+def _unique_anchors(a, alo, ahi, b, blo, bhi):
+    """Patience anchors: lines unique on both sides, as the LIS of their (i, j) pairs."""
+    counts = {}
+    for i in range(alo, ahi):
+        entry = counts.get(a[i])
+        counts[a[i]] = [1, i, None] if entry is None else [entry[0] + 1, i, None]
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None and entry[0] == 1:
+            entry[2] = j if entry[2] is None else -1
+    pairs = sorted((entry[1], entry[2]) for entry in counts.values()
+                   if entry[0] == 1 and entry[2] is not None and entry[2] >= 0)
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence on j (patience sorting)
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos:
+            previous[index] = tail_index[pos - 1]
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[pos] = j
+            tail_index[pos] = index
+    result, index = [], tail_index[-1]
+    while index is not None:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+def _myers(a, alo, ahi, b, blo, bhi, max_d=MAX_EDIT_DISTANCE):
+    """
+    Myers' greedy diff of a[alo:ahi] and b[blo:bhi]. Returns opcodes, or None
+    if more than max_d edits are needed.
+    """
+    n, m = ahi - alo, bhi - blo
+    # Every line without a partner on the other side costs one edit
+    counts = Counter(a[alo:ahi])
+    counts.subtract(b[blo:bhi])
+    if sum(abs(c) for c in counts.values()) > max_d:
+        return None
+    offset = n + m + 1
+    v = [0] * (2 * offset + 1)
+    trace = []
+    for d in range(min(n + m, max_d) + 1):
+        trace.append(v[offset - d:offset + d + 1])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, d, n, m, alo, blo)
+    return None
+
+def _myers_backtrack(trace, d, n, m, alo, blo):
+    ops = []
+    x, y = n, m
+    for depth in range(d, 0, -1):
+        snapshot = trace[depth]  # v before round depth, indexed k + depth
+        k = x - y
+        if k == -depth or (k != depth and snapshot[k - 1 + depth] < snapshot[k + 1 + depth]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = snapshot[prev_k + depth]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            ops.append(('equal', alo + x, alo + x + 1, blo + y, blo + y + 1))
+        if x == prev_x:
+            ops.append(('insert', alo + x, alo + x, blo + prev_y, blo + y))
+        else:
+            ops.append(('delete', alo + prev_x, alo + x, blo + y, blo + y))
+        x, y = prev_x, prev_y
+    if x > 0:
+        ops.append(('equal', alo, alo + x, blo, blo + y))
+    ops.reverse()
+    return ops
+
+def _opcodes(a, b):
+    """Opcodes (tag, i1, i2, j1, j2) like difflib's, with tag in equal/insert/delete/replace."""
+    ops = []
+    stack = [('range', 0, len(a), 0, len(b))]
+    while stack:
+        task = stack.pop()
+        if task[0] != 'range':
+            ops.append(task)
+            continue
+        _, alo, ahi, blo, bhi = task
+        start = alo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        prefix = alo - start
+        end_a, end_b = ahi, bhi
+        while ahi > alo and bhi > blo and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+
+        pending = []
+        if prefix:
+            pending.append(('equal', alo - prefix, alo, blo - prefix, blo))
+        if alo == ahi and blo < bhi:
+            pending.append(('insert', alo, alo, blo, bhi))
+        elif blo == bhi and alo < ahi:
+            pending.append(('delete', alo, ahi, blo, blo))
+        elif alo < ahi:
+            anchors = _unique_anchors(a, alo, ahi, b, blo, bhi)
+            if anchors:
+                i, j = alo, blo
+                for ai, bj in anchors:
+                    pending.append(('range', i, ai, j, bj))
+                    pending.append(('equal', ai, ai + 1, bj, bj + 1))
+                    i, j = ai + 1, bj + 1
+                pending.append(('range', i, ahi, j, bhi))
+            else:
+                myers = _myers(a, alo, ahi, b, blo, bhi)
+                pending.extend(myers if myers is not None else [('replace', alo, ahi, blo, bhi)])
+        if ahi < end_a:
+            pending.append(('equal', ahi, end_a, bhi, end_b))
+        stack.extend(reversed(pending))
+    return _merge(ops)
+
+def _merge(ops):
+    """Coalesce adjacent opcodes; a delete next to an insert becomes a replace."""
+    merged = []
+    for tag, i1, i2, j1, j2 in ops:
+        if i1 == i2 and j1 == j2:
+            continue
+        if merged:
+            ptag, pi1, pi2, pj1, pj2 = merged[-1]
+            if ptag == tag or (ptag != 'equal' and tag != 'equal'):
+                merged[-1] = (tag if ptag == tag else 'replace', pi1, i2, pj1, j2)
+                continue
+        merged.append((tag, i1, i2, j1, j2))
+    return merged
+
+def _hunks(ops, old_lines, new_lines, context, max_lines):
+    hunks, emitted, truncated = [], 0, False
+    current = None
+    for index, (tag, i1, i2, j1, j2) in enumerate(ops):
+        if tag == 'equal':
+            if current is None:
+                continue
+            last = index == len(ops) - 1
+            if last or i2 - i1 > 2 * context:
+                # Close the hunk with trailing context
+                tail = min(context, i2 - i1)
+                current["lines"].extend([" ", line] for line in old_lines[i1:i1 + tail])
+                current["old_lines"] += tail
+                current["new_lines"] += tail
+                hunks.append(current)
+                current = None
+            else:
+                current["lines"].extend([" ", line] for line in old_lines[i1:i2])
+                current["old_lines"] += i2 - i1
+                current["new_lines"] += i2 - i1
+            continue
+
+        if current is None:
+            lead = 0
+            if index and ops[index - 1][0] == 'equal':
+                lead = min(context, i1 - ops[index - 1][1])
+            current = {"old_start": i1 - lead + 1, "new_start": j1 - lead + 1,
+                       "old_lines": lead, "new_lines": lead,
+                       "lines": [[" ", line] for line in old_lines[i1 - lead:i1]]}
+        if emitted + (i2 - i1) + (j2 - j1) > max_lines:
+            truncated = True
+            break
+        current["lines"].extend(["-", line] for line in old_lines[i1:i2])
+        current["lines"].extend(["+", line] for line in new_lines[j1:j2])
+        current["old_lines"] += i2 - i1
+        current["new_lines"] += j2 - j1
+        emitted += (i2 - i1) + (j2 - j1)
+    if current is not None:
+        hunks.append(current)
+    return hunks, truncated
+
+def diff_lines(old_lines, new_lines, context=CONTEXT_LINES, max_lines=MAX_DIFF_LINES, key=None):
+    """
+    Structured diff of two line lists (no caching).
+    key(line) maps lines to the value compared (e.g. normalized text); hunks keep the original lines.
+    """
+    a, b = _intern(old_lines, new_lines, key)
+    ops = _opcodes(a, b)
+    stats = {"added": 0, "removed": 0, "unchanged": 0}
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == 'equal':
+            stats["unchanged"] += i2 - i1
+        else:
+            stats["removed"] += i2 - i1
+            stats["added"] += j2 - j1
+    hunks, truncated = _hunks(ops, old_lines, new_lines, context, max_lines)
+    return {"stats": stats, "hunks": hunks, "truncated": truncated}
+
+def diff_texts(old_text, new_text, old_hash=None, new_hash=None, context=CONTEXT_LINES):
+    """
+    Structured diff of two texts, cached by (old_hash, new_hash, context).
+    Hashes default to SHA-256 of the texts; pass stored hashes to skip hashing.
+    """
+    old_text, new_text = old_text or "", new_text or ""
+    key = (old_hash or analyzer.calculate_hash(old_text), new_hash or analyzer.calculate_hash(new_text), context)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    result = diff_lines(old_text.splitlines(), new_text.splitlines(), context)
+    result["old_hash"], result["new_hash"] = key[0], key[1]
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return result
+
+def render_html(diff, old_label="Old", new_label="New"):
+    """Compact HTML table of a structured diff (hunks only), for non-JS clients."""
+    stats = diff["stats"]
+    rows = [f'<table class="diff"><thead><tr><th colspan="3">{escape(old_label)} → {escape(new_label)}: '
+            f'+{stats["added"]} / -{stats["removed"]} lines</th></tr></thead><tbody>']
+    css = {"+": "diff_add", "-": "diff_sub", " ": ""}
+    for hunk in diff["hunks"]:
+        rows.append(f'<tr class="diff_header"><td colspan="3">@@ -{hunk["old_start"]},{hunk["old_lines"]} '
+                    f'+{hunk["new_start"]},{hunk["new_lines"]} @@</td></tr>')
+        old_no, new_no = hunk["old_start"], hunk["new_start"]
+        for op, line in hunk["lines"]:
+            left = old_no if op != "+" else ""
+            right = new_no if op != "-" else ""
+            old_no += op != "+"
+            new_no += op != "-"
+            rows.append(f'<tr class="{css[op]}"><td>{left}</td><td>{right}</td><td>{escape(op)} {escape(line)}</td></tr>')
+    if diff["truncated"]:
+        rows.append('<tr class="diff_header"><td colspan="3">… diff truncated</td></tr>')
+    rows.append("</tbody></table>")
+    return "".join(rows)
@@ -0,0 +1,192 @@
+"""
+Sitemap- and feed-driven URL discovery.
+Reads Sitemap: entries from robots.txt (falling back to /sitemap.xml), follows
+sitemap indexes, and parses RSS/Atom feeds so the crawler can seed its frontier
+with deep pages and skip pages whose lastmod has not advanced.
+"""
+
+from collections import deque
+import datetime
+import re
+import zlib
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin, urlparse
+import requests
+from bs4 import BeautifulSoup
+import scraper
+import canonical
+
+MAX_SITEMAPS = 50  # Sitemap files fetched per discovery run (indexes included)
+MAX_DISCOVERED_URLS = 50000
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024  # Uncompressed size cap (the sitemap protocol's own limit)
+FEED_TYPES = ('application/rss+xml', 'application/atom+xml', 'application/feed+json')
+
+def _gunzip(body, limit=MAX_SITEMAP_BYTES):
+    """Decompress gzip data, or return None if it inflates beyond limit (gzip bombs)."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, limit + 1)
+    if len(data) > limit or decompressor.unconsumed_tail:
+        return None
+    return data
+
+def _fetch_bytes(url):
+    """Fetch a sitemap or feed (at most MAX_SITEMAP_BYTES); transparently gunzips .gz sitemaps."""
+    if scraper.is_circuit_open(url):
+        return None
+    scraper.politeness_scheduler.wait(url)
+    try:
+        with requests.get(url, headers=scraper.get_random_headers(), timeout=15, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body += chunk
+                if len(body) > MAX_SITEMAP_BYTES:
+                    print(f"Discovery skipped {url}: larger than {MAX_SITEMAP_BYTES} bytes")
+                    return None
+        body = bytes(body)
+        if body[:2] == b'\x1f\x8b':
+            body = _gunzip(body)
+            if body is None:
+                print(f"Discovery skipped {url}: decompresses to more than {MAX_SITEMAP_BYTES} bytes")
+        return body
+    except Exception as e:
+        print(f"Discovery error fetching {url}: {e}")
+        return None
+
+_DATE_ONLY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def parse_lastmod(value):
+    """
+    Parse a W3C datetime or RFC 822 date into a naive local datetime.
+    A date without a time means "some time that day", so it is read as the end of the day.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if _DATE_ONLY.match(value):
+        try:
+            return datetime.datetime.combine(datetime.date.fromisoformat(value), datetime.time.max)
+        except ValueError:
+            return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def get_robots_sitemaps(root_url):
+    """Return the sitemap URLs advertised in robots.txt (or the default location)."""
+    parsed = urlparse(root_url)
+    base = f"{parsed.scheme}://{parsed.netloc}"
+    sitemaps = scraper.politeness_scheduler.robots.sitemaps(root_url)
+    return list(sitemaps) or [f"{base}/sitemap.xml"]
+
+def parse_sitemap(xml):
+    """
+    Parse a sitemap document.
+    Returns (kind, entries) where kind is 'index' or 'urlset' and entries are (loc, lastmod) tuples.
+    """
+    soup = BeautifulSoup(xml, 'xml')
+    if soup.find('sitemapindex'):
+        kind, tag = 'index', 'sitemap'
+    else:
+        kind, tag = 'urlset', 'url'
+
+    entries = []
+    for node in soup.find_all(tag):
+        loc = node.find('loc')
+        if not loc or not loc.text.strip():
+            continue
+        lastmod = node.find('lastmod')
+        entries.append((loc.text.strip(), parse_lastmod(lastmod.text) if lastmod else None))
+    return kind, entries
+
+def parse_feed(xml):
+    """Parse an RSS or Atom feed into (link, updated) tuples."""
+    soup = BeautifulSoup(xml, 'xml')
+    entries = []
+    for item in soup.find_all('item'):
+        link = item.find('link')
+        date = item.find('pubDate') or item.find('date')
+        if link and link.text.strip():
+            entries.append((link.text.strip(), parse_lastmod(date.text) if date else None))
+    for entry in soup.find_all('entry'):
+        link = entry.find('link', rel='alternate') or entry.find('link')
+        date = entry.find('updated') or entry.find('published')
+        href = link.get('href') if link else None
+        if href:
+            entries.append((href.strip(), parse_lastmod(date.text) if date else None))
+    return entries
+
+def find_feed_links(url, html):
+    """Return feed URLs advertised via <link rel="alternate"> on a page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    feeds = []
+    for link in soup.find_all('link', href=True):
+        rel = link.get('rel') or []
+        if 'alternate' in rel and link.get('type', '').lower() in FEED_TYPES:
+            feeds.append(urljoin(url, link['href']))
+    return feeds
+
+def discover_from_feeds(root_url, feed_urls):
+    """Fetch feeds and return {url: lastmod} for same-site entries."""
+    base_domain = urlparse(root_url).netloc
+    discovered = {}
+    for feed_url in feed_urls:
+        body = _fetch_bytes(feed_url)
+        if not body:
+            continue
+        for link, updated in parse_feed(body):
+            if scraper.is_valid_url(link, base_domain):
+                discovered[canonical.canonicalize(link, base_domain)] = updated
+    return discovered
+
+def discover_from_sitemaps(root_url):
+    """Walk robots.txt sitemaps (and sitemap indexes) and return {url: lastmod}."""
+    base_domain = urlparse(root_url).netloc
+    pending = deque(get_robots_sitemaps(root_url))
+    seen = set()
+    discovered = {}
+
+    while pending and len(seen) < MAX_SITEMAPS and len(discovered) < MAX_DISCOVERED_URLS:
+        sitemap_url = pending.popleft()
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+
+        body = _fetch_bytes(sitemap_url)
+        if not body:
+            continue
+        kind, entries = parse_sitemap(body)
+        for loc, lastmod in entries:
+            if not scraper.is_valid_url(loc, base_domain):
+                continue  # Neither child sitemaps nor pages may lead off the site
+            if kind == 'index':
+                pending.append(loc)
+            else:
+                discovered[canonical.canonicalize(loc, base_domain)] = lastmod
+                if len(discovered) >= MAX_DISCOVERED_URLS:
+                    break
+
+    if discovered:
+        print(f"Discovered {len(discovered)} URLs from {len(seen)} sitemap(s) for {root_url}")
+    return discovered
+
+def is_unchanged(lastmod, last_scraped):
+    """True if the page's lastmod is not newer than our last successful scrape."""
+    if not lastmod or not last_scraped:
+        return False
+    try:
+        return lastmod <= datetime.datetime.fromisoformat(last_scraped)
+    except ValueError:
+        return False
+
+def order_by_freshness(discovered):
+    """Newest lastmod first; entries without a lastmod go last."""
+    return sorted(discovered, key=lambda url: discovered[url] or datetime.datetime.min, reverse=True)
@@ -0,0 +1,135 @@
+"""
+Process-pool offload for CPU-bound page extraction.
+Text extraction, link discovery and hashing are pure-Python BeautifulSoup work
+that holds the GIL; running them in worker processes keeps Flask request
+handling and other crawls responsive. Pages are shipped as raw bytes and small
+pages are batched into one IPC round trip.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+import scraper
+import canonical
+import content_fingerprint
+
+BATCH_SIZE = 8  # Pages per IPC round trip
+BATCH_BYTES = 512 * 1024  # Flush a batch early once it holds this much HTML
+MAX_BATCH_WAIT = 0.02  # Seconds a page may wait for batch-mates
+DEFAULT_PROCESSES = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+def extract_page(url, html, content_type='', follow_links=True, volatile_patterns=None):
+    """
+    Extract text, content fingerprints, internal links and <link rel=canonical> from a page.
+    html may be str or UTF-8 bytes. Returns a dict; used both in-process and in pool workers.
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    content_type = content_type or ''
+    text = scraper.extract_text(html, content_type)
+    lowered = content_type.lower()
+    is_html = 'html' in lowered or not lowered
+    content_hash, simhash = content_fingerprint.fingerprint(text, volatile_patterns)
+    return {
+        "text": text,
+        "content_hash": content_hash,
+        "simhash": simhash,
+        "canonical_url": canonical.find_canonical(url, html) if is_html else None,
+        "links": scraper.get_internal_links(url, html, content_type) if follow_links and is_html else []
+    }
+
+def extract_batch(items):
+    """Run extract_page over (url, html_bytes, content_type, follow_links, volatile_patterns) tuples."""
+    return [extract_page(*item) for item in items]
+
+class ExtractPool:
+    """Batches extraction requests from crawl threads onto a process pool."""
+
+    def __init__(self, processes=DEFAULT_PROCESSES, batch_size=BATCH_SIZE, batch_bytes=BATCH_BYTES,
+                 max_wait=MAX_BATCH_WAIT):
+        # spawn: forking a process that already runs Flask and crawl threads is unsafe
+        self._executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.max_wait = max_wait
+        self._pending = []
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self.batches = 0
+        self.pages = 0
+
+    def submit(self, url, html, content_type='', follow_links=True, volatile_patterns=None):
+        """Queue a page for extraction; returns a Future resolving to extract_page()'s dict."""
+        future = Future()
+        body = html.encode('utf-8') if isinstance(html, str) else html
+        with self._lock:
+            self._pending.append(((url, body, content_type, follow_links, tuple(volatile_patterns or ())), future))
+            self._pending_bytes += len(body)
+            if len(self._pending) >= self.batch_size or self._pending_bytes >= self.batch_bytes:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_wait, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def extract(self, url, html, content_type='', follow_links=True, volatile_patterns=None):
+        """Blocking helper: extract one page in the pool."""
+        return self.submit(url, html, content_type, follow_links, volatile_patterns).result()
+
+    def _flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_bytes = self._pending, [], 0
+        self.batches += 1
+        self.pages += len(batch)
+        futures = [future for _, future in batch]
+        try:
+            remote = self._executor.submit(extract_batch, [item for item, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        remote.add_done_callback(lambda done: self._resolve(done, futures))
+
+    @staticmethod
+    def _resolve(done, futures):
+        try:
+            results = done.result()
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "pages": self.pages,
+            "avg_batch_size": round(self.pages / self.batches, 2) if self.batches else 0
+        }
+
+    def shutdown(self):
+        self._flush()
+        self._executor.shutdown(wait=False)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Shared ExtractPool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractPool()
+        return _pool
@@ -0,0 +1,150 @@
+"""
+Crawl job registry.
+Runs crawl jobs on a bounded thread pool, coalesces duplicate requests for the
+same root URL while one is already queued or running, and tracks each job's
+status (queued, running, done, failed, cancelled) with cooperative cancellation.
+At most one job per root URL is active; a full crawl requested during a revisit
+cancels the revisit and starts once it has stopped.
+"""
+
+import datetime
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENT_JOBS = 2
+MAX_FINISHED_JOBS = 200  # Finished jobs kept for the status API
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+class Job:
+    """One crawl request. func(job) should stop early once job.cancel_event is set."""
+
+    def __init__(self, key, func, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.kind = kind
+        self.func = func
+        self.status = QUEUED
+        self.error = None
+        self.coalesced = 0  # Duplicate requests merged into this job
+        self.created_at = datetime.datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None  # None while waiting for the job it supersedes to stop
+        self.successor = None  # Job that superseded this one and starts when it finishes
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATES
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "root_url": self.key,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "coalesced": self.coalesced,
+            "superseded_by": self.successor.id if self.successor else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class JobRegistry:
+    """Bounded executor plus per-key de-duplication of queued/running jobs."""
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crawl-job')
+        self._jobs = OrderedDict()  # id -> Job, oldest first
+        self._active = {}  # key -> active Job
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, kind='full'):
+        """
+        Queue func(job) for key unless an equivalent job is already queued or running.
+        A 'full' request is not satisfied by an active 'due' (revisit) job: the
+        revisit is cancelled and the full job starts when it has stopped.
+        Returns the Job that will serve the request.
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing and existing.active and (existing.kind == 'full' or kind != 'full'):
+                existing.coalesced += 1
+                return existing
+
+            job = Job(key, func, kind)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._prune()
+            if existing and existing.active:
+                existing.successor = job
+                self._cancel(existing)  # Starts job once existing has stopped
+            else:
+                job.future = self._executor.submit(self._run, job)
+            return job
+
+    def _run(self, job):
+        with self._lock:
+            if job.cancel_event.is_set():
+                job.status = CANCELLED
+                self._finish(job)
+                return
+            job.status = RUNNING
+            job.started_at = datetime.datetime.now().isoformat()
+        try:
+            job.func(job)
+            status, error = (CANCELLED if job.cancel_event.is_set() else DONE), None
+        except Exception as e:
+            traceback.print_exc()
+            status, error = FAILED, str(e)
+        with self._lock:
+            job.status = status
+            job.error = error
+            self._finish(job)
+
+    def _finish(self, job):
+        job.finished_at = datetime.datetime.now().isoformat()
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+        successor = job.successor
+        if successor is not None and successor.active and successor.future is None:
+            successor.future = self._executor.submit(self._run, successor)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def cancel(self, job_id):
+        """Cancel a queued job or ask a running one to stop. Returns the Job or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.active:
+                self._cancel(job)
+            return job
+
+    def _cancel(self, job):
+        job.cancel_event.set()
+        # A job still waiting for its predecessor has no future yet
+        if job.status == QUEUED and (job.future is None or job.future.cancel()):
+            job.status = CANCELLED
+            self._finish(job)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All tracked jobs, newest first."""
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
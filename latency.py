@@ -0,0 +1,100 @@
+"""
+Per-host latency histograms.
+Used to derive adaptive request timeouts (p99 x factor, within bounds) and the
+delay after which a hedged duplicate request is fired (p95).
+"""
+
+import bisect
+import threading
+
+# Histogram bucket upper bounds in seconds (roughly logarithmic)
+BUCKET_BOUNDS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 20, 30, 45, 60]
+
+MIN_SAMPLES = 20  # Below this we fall back to the default timeout
+TIMEOUT_FACTOR = 3.0
+MIN_TIMEOUT = 3.0
+MAX_TIMEOUT = 45.0
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_HEDGE_DELAY = 2.0
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (constant memory per host)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+
+    def percentile(self, p):
+        """Return the bucket upper bound containing the p-th percentile."""
+        if not self.total:
+            return None
+        target = self.total * p / 100.0
+        running = 0
+        for i, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else BUCKET_BOUNDS[-1] * 2
+        return BUCKET_BOUNDS[-1] * 2
+
+    def to_dict(self):
+        return {
+            "samples": self.total,
+            "timeouts": self.timeouts,
+            "mean": round(self.sum / self.total, 3) if self.total else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {(f"<={b}" if i < len(BUCKET_BOUNDS) else f">{BUCKET_BOUNDS[-1]}"): c
+                        for i, (b, c) in enumerate(zip(BUCKET_BOUNDS + [BUCKET_BOUNDS[-1]], self.counts))}
+        }
+
+class LatencyTracker:
+    """Thread-safe collection of per-host histograms."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _get(self, host):
+        if host not in self._histograms:
+            self._histograms[host] = LatencyHistogram()
+        return self._histograms[host]
+
+    def observe(self, host, seconds):
+        with self._lock:
+            self._get(host).observe(seconds)
+
+    def observe_timeout(self, host, timeout):
+        """A timed-out request still tells us the host is at least this slow."""
+        with self._lock:
+            histogram = self._get(host)
+            histogram.observe(timeout)
+            histogram.timeouts += 1
+
+    def timeout_for(self, host, default=DEFAULT_TIMEOUT):
+        """Adaptive timeout: p99 x factor, clamped to [MIN_TIMEOUT, MAX_TIMEOUT]."""
+        with self._lock:
+            histogram = self._histograms.get(host)
+            if not histogram or histogram.total < MIN_SAMPLES:
+                return default
+            p99 = histogram.percentile(99)
+        return max(MIN_TIMEOUT, min(MAX_TIMEOUT, p99 * TIMEOUT_FACTOR))
+
+    def hedge_delay_for(self, host, default=DEFAULT_HEDGE_DELAY):
+        """How long to wait before firing a hedged duplicate request (p95)."""
+        with self._lock:
+            histogram = self._histograms.get(host)
+            if not histogram or histogram.total < MIN_SAMPLES:
+                return default
+            return histogram.percentile(95)
+
+    def stats(self):
+        with self._lock:
+            return {host: histogram.to_dict() for host, histogram in self._histograms.items()}
@@ -0,0 +1,165 @@
+"""
+Concurrent, rate-limited summarization.
+A SummaryPipeline runs page summaries on a bounded thread pool so crawling can
+continue while OpenAI calls are in flight. Requests-per-minute and
+tokens-per-minute limiters are shared by every pipeline in the process, 429
+responses are retried with exponential back-off and full jitter (or the
+server's Retry-After), and each pipeline has an overall deadline.
+Set OPENAI_BASE_URL to run against a local OpenAI-compatible stand-in.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
+import openai
+import analyzer
+
+DEFAULT_CONCURRENCY = 4
+MAX_PENDING_PER_WORKER = 8  # Submitters block beyond concurrency * this many queued pages
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200000
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # Seconds; doubled per 429 retry, then jittered
+BACKOFF_MAX = 30.0
+JOB_DEADLINE = 15 * 60  # Seconds a crawl's summaries may take in total
+CHARS_PER_TOKEN = 4
+EXPECTED_OUTPUT_TOKENS = 300
+
+class DeadlineExceeded(Exception):
+    pass
+
+class RateLimiter:
+    """Per-minute budget (requests or tokens) as a reservation-based token bucket."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take amount from the budget and return how long the caller must wait for it."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            self.total_wait += wait
+            return wait
+
+    def refund(self, amount=1):
+        """Give back a reservation that will not be used."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+request_limiter = RateLimiter(REQUESTS_PER_MINUTE)
+token_limiter = RateLimiter(TOKENS_PER_MINUTE)
+
+_stats = {"requests": 0, "rate_limited": 0, "retries": 0, "failures": 0, "deadline_exceeded": 0}
+_stats_lock = threading.Lock()
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["rpm_wait_seconds"] = round(request_limiter.total_wait, 2)
+    stats["tpm_wait_seconds"] = round(token_limiter.total_wait, 2)
+    return stats
+
+def estimate_tokens(text):
+    return len(analyzer.summary_prompt(text)) // CHARS_PER_TOKEN + EXPECTED_OUTPUT_TOKENS
+
+def _retry_delay(error, attempt):
+    """Retry-After from the 429 response if present, else exponential back-off with full jitter."""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        if retry_after:
+            return min(BACKOFF_MAX, float(retry_after))
+    except ValueError:
+        pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def _reserve(tokens, deadline):
+    """Wait for one request and tokens of RPM/TPM budget; nothing stays reserved if the deadline would pass first."""
+    delay = max(request_limiter.reserve(), token_limiter.reserve(tokens))
+    if deadline is not None and time.monotonic() + delay > deadline:
+        request_limiter.refund()
+        token_limiter.refund(tokens)
+        raise DeadlineExceeded()
+    if delay > 0:
+        time.sleep(delay)
+
+def _sleep_until(delay, deadline):
+    if deadline is not None and time.monotonic() + delay > deadline:
+        raise DeadlineExceeded()
+    if delay > 0:
+        time.sleep(delay)
+
+def summarize(text, api_key, content_hash=None, deadline=None):
+    """
+    Rate-limited, retrying equivalent of analyzer.summarize_text (cache included).
+    deadline is a time.monotonic() timestamp after which no new attempt is started;
+    past it DeadlineExceeded is raised, so no failure text is stored as the summary.
+    """
+    if not text or not api_key:
+        return analyzer.summarize_text(text, api_key)
+    content_hash = content_hash or analyzer.calculate_hash(text)
+    cached = analyzer.get_cached_summary(content_hash)
+    if cached is not None:
+        return cached
+
+    tokens = estimate_tokens(text)
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            _reserve(tokens, deadline)
+            _count("requests")
+            try:
+                summary = analyzer.request_summary(text, api_key, max_retries=0)
+            except openai.RateLimitError as e:
+                _count("rate_limited")
+                if attempt == MAX_RETRIES:
+                    raise
+                _count("retries")
+                _sleep_until(_retry_delay(e, attempt), deadline)
+                continue
+            analyzer.cache_summary(content_hash, summary)
+            return summary
+    except DeadlineExceeded:
+        _count("deadline_exceeded")
+        raise
+    except Exception as e:
+        _count("failures")
+        return f"AI Summary Failed: {str(e)}"
+
+class SummaryPipeline:
+    """Bounded pool of summarize() calls for one crawl job."""
+
+    def __init__(self, api_key, concurrency=DEFAULT_CONCURRENCY, deadline=JOB_DEADLINE):
+        self.api_key = api_key
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='summarize')
+        self._pending = threading.BoundedSemaphore(concurrency * MAX_PENDING_PER_WORKER)
+
+    def submit(self, text, content_hash=None):
+        """
+        Queue a summary; returns a Future resolving to the summary string (or raising
+        DeadlineExceeded once the pipeline's deadline has passed). Blocks if the backlog is full.
+        """
+        self._pending.acquire()
+        future = self._executor.submit(summarize, text, self.api_key, content_hash, self.deadline)
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def join(self):
+        """Wait for every queued summary (and its callbacks) to finish."""
+        self._executor.shutdown(wait=True)
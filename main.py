@@ -3,65 +3,49 @@ import argparse
 import schedule
 from urllib.parse import urlparse
 import storage
-import scraper
 import analyzer
+import change_analysis
+import crawl_engine
 import scheduler_service
 
-def process_url(url, visited):
-    """Process a single URL: fetch, check change, summarize, save."""
-    if url in visited:
-        return
-    visited.add(url)
-    
-    print(f"Checking: {url}")
-    html = scraper.fetch_page(url)
-    if not html:
-        return
+def check_page(page):
+    """Crawl stage: check for change, summarize, save."""
+    print(f"Checking: {page.url}")
 
-    text = scraper.extract_text(html)
-    new_hash = analyzer.calculate_hash(text)
-    
     # Check previous state
-    old_data = storage.get_page(url)
+    old_data = storage.get_page(page.url)
     
     if old_data:
-        if analyzer.detect_change(old_data['content_hash'], new_hash):
-            print(f"  [!] CHANGE DETECTED at {url}")
-            summary = analyzer.summarize_text(text)
-            storage.save_page(url, new_hash, summary)
+        # Pages saved before fingerprinting (no simhash) are re-baselined by save_page
+        if analyzer.detect_change(old_data['content_hash'], page.content_hash) and old_data['simhash']:
+            print(f"  [!] CHANGE DETECTED at {page.url}")
+            summary = analyzer.summarize_text(page.text)
+            storage.save_page(page.url, page.content_hash, summary, page.text, simhash=page.simhash)
             print(f"  -> New Summary: {summary.splitlines()[0]}...")
         else:
-            print(f"  [=] No change at {url}")
+            if old_data['simhash'] is None:
+                storage.save_page(page.url, page.content_hash, old_data['summary'], page.text, simhash=page.simhash)
+            print(f"  [=] No change at {page.url}")
     else:
-        print(f"  [+] New page found: {url}")
-        summary = analyzer.summarize_text(text)
-        storage.save_page(url, new_hash, summary)
-
-    # Return links for crawling
-    return scraper.get_internal_links(url, html)
+        print(f"  [+] New page found: {page.url}")
+        summary = analyzer.summarize_text(page.text)
+        storage.save_page(page.url, page.content_hash, summary, page.text, root_url=page.root_url, simhash=page.simhash)
 
 def job(start_url):
     """The main job to run periodically."""
     print(f"\n--- Starting Job for {start_url} ---")
     storage.init_db()
     
-    # BFS Queue for crawling
-    queue = [start_url]
-    visited = set()
-    
     # Limit pages to avoid infinite loops in this demo
     MAX_PAGES = 50 
     
-    while queue and len(visited) < MAX_PAGES:
-        current_url = queue.pop(0)
-        links = process_url(current_url, visited)
-        
-        if links:
-            for link in links:
-                if link not in visited and link not in queue:
-                    queue.append(link)
+    engine = crawl_engine.CrawlEngine(start_url, stages=[check_page], max_pages=MAX_PAGES,
+                                      volatile_patterns=storage.get_volatile_patterns(start_url))
+    engine.run()
+    # Score and summarize the changes found, so they don't stay 'pending'
+    change_analysis.process_pending(root_url=start_url)
                     
-    print(f"--- Job Finished. Scanned {len(visited)} pages. ---")
+    print(f"--- Job Finished. Scanned {engine.pages_visited} pages. ---")
 
 def main():
     parser = argparse.ArgumentParser(description="Website Monitor & Scraper")
@@ -0,0 +1,149 @@
+"""
+Incremental, hierarchical master summaries.
+A site's master summary is rebuilt only when the set of page summaries it was
+built from changed (tracked by a digest on site_summaries). Sites whose page
+summaries fit in one prompt are summarized directly; larger sites are
+map-reduced: pages are grouped into sections by top-level path, each section
+is summarized, and section summaries are reduced level by level until they fit
+the final master prompt. Every intermediate summary is stored in the summary
+cache keyed by a hash of its inputs, so unchanged sections cost no LLM calls.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import hashlib
+import storage
+import analyzer
+
+MASTER_INPUT_CHARS = 15000  # generate_master_summary's prompt limit
+SECTION_CHARS = 12000  # Max input per section (or reduce-step) summary
+SMALL_SECTION_CHARS = SECTION_CHARS // 4  # Smaller path sections are pooled together
+SECTION_CONCURRENCY = 4
+SECTION_PROMPT_VERSION = 1  # Bump when the section prompt changes
+FAILED_PREFIXES = storage.PLACEHOLDER_SUMMARY_PREFIXES
+
+class SectionSummaryFailed(Exception):
+    pass
+
+def summaries_digest(pages):
+    """Stable digest of (url, summary) pairs; changes whenever any page summary does."""
+    digest = hashlib.sha256()
+    for url, summary in pages:
+        digest.update(f"{url}\t{summary}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def _section_key(url):
+    segments = [s for s in urlparse(url).path.split('/') if s]
+    return segments[0] if len(segments) > 1 else ''
+
+def _pack(entries, limit=SECTION_CHARS):
+    """Greedily pack texts, in order, into chunks of at most limit chars (oversized texts stand alone)."""
+    chunks, current, size = [], [], 0
+    for entry in entries:
+        if current and size + len(entry) > limit:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += len(entry) + 2
+    if current:
+        chunks.append(current)
+    return chunks
+
+def group_sections(pages):
+    """
+    Split (url, summary) pairs into sections of at most SECTION_CHARS.
+    Pages are grouped by top-level path so an edit only reshuffles its own
+    section; tiny path groups are pooled so they do not each cost a call.
+    """
+    by_path = {}
+    for url, summary in pages:
+        by_path.setdefault(_section_key(url), []).append(f"{url}: {summary}")
+    sections, pooled = [], []
+    for key in sorted(by_path):
+        entries = by_path[key]
+        if sum(len(e) for e in entries) < SMALL_SECTION_CHARS:
+            pooled.extend(entries)
+        else:
+            sections.extend(_pack(entries))
+    return sections + _pack(pooled)
+
+def summarize_section(entries, api_key):
+    """Summarize one chunk of page (or section) summaries, served from the cache when unchanged."""
+    text = "\n\n".join(entries)
+    content_hash = analyzer.calculate_hash("section\n" + text)
+    try:
+        cached = storage.get_cached_summary(content_hash, analyzer.SUMMARY_MODEL, SECTION_PROMPT_VERSION,
+                                            analyzer.SUMMARY_CACHE_TTL)
+    except Exception:
+        cached = None
+    if cached is not None:
+        return cached, False
+
+    try:
+        summary = analyzer.chat_completion(api_key, "section_summary", [
+            {"role": "system", "content": "You are a helpful assistant. You will be given summaries of pages from one section of a website. Summarize what this section covers in one concise paragraph, keeping concrete names, products and facts."},
+            {"role": "user", "content": f"Here are the page summaries:\n\n{text}"}
+        ], model=analyzer.SUMMARY_MODEL)
+    except Exception as e:
+        raise SectionSummaryFailed(str(e))
+    try:
+        storage.save_cached_summary(content_hash, analyzer.SUMMARY_MODEL, SECTION_PROMPT_VERSION, summary)
+    except Exception:
+        pass
+    return summary, True
+
+def build_master_summary(pages, api_key):
+    """
+    Master summary over (url, summary) pairs. Returns (summary, stats) where
+    stats counts sections, reduce levels and section summaries actually generated.
+    """
+    stats = {"pages": len(pages), "sections": 0, "levels": 0, "generated": 0}
+    summaries = [summary for _, summary in pages]
+    if sum(len(s) + 2 for s in summaries) <= MASTER_INPUT_CHARS:
+        return analyzer.generate_master_summary(summaries, api_key), stats
+
+    chunks = group_sections(pages)
+    stats["sections"] = len(chunks)
+    with ThreadPoolExecutor(max_workers=SECTION_CONCURRENCY, thread_name_prefix='section-summary') as executor:
+        while True:
+            stats["levels"] += 1
+            results = list(executor.map(lambda chunk: summarize_section(chunk, api_key), chunks))
+            stats["generated"] += sum(1 for _, generated in results if generated)
+            summaries = [summary for summary, _ in results]
+            if len(summaries) == 1 or sum(len(s) + 2 for s in summaries) <= MASTER_INPUT_CHARS:
+                break
+            chunks = _pack(summaries)
+            if len(chunks) == len(summaries):
+                break  # Summaries too long to combine further; the master prompt truncates
+    return analyzer.generate_master_summary(summaries, api_key), stats
+
+def update_master_summary(root_url, api_key, force=False):
+    """
+    Rebuild and save the master summary for root_url if its page summaries changed.
+    Returns True if a new summary was saved.
+    """
+    if not api_key:
+        return False
+    pages = [(url, summary) for url, summary in storage.get_page_summaries(root_url)
+             if not summary.startswith(FAILED_PREFIXES)]
+    if not pages:
+        return False
+    digest = summaries_digest(pages)
+    if not force and storage.get_site_summary_source_hash(root_url) == digest:
+        print(f"Master summary for {root_url} is up to date")
+        return False
+
+    print(f"Generating master summary for {root_url} from {len(pages)} page summaries...")
+    try:
+        summary, stats = build_master_summary(pages, api_key)
+    except SectionSummaryFailed as e:
+        summary, stats = f"Master Summary Failed: {e}", None
+    failed = summary.startswith(FAILED_PREFIXES)
+    # A failed build keeps no digest so the next crawl retries it
+    storage.save_site_summary(root_url, summary, None if failed else digest)
+    if stats and stats["sections"]:
+        print(f"Master summary saved for {root_url} ({stats['sections']} sections, {stats['levels']} levels, "
+              f"{stats['generated']} section summaries generated)")
+    else:
+        print(f"Master summary saved for {root_url}")
+    return True
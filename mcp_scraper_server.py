@@ -11,6 +11,8 @@ from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent, Resource, ResourceTemplate
 import scraper
 import analyzer
+import content_fingerprint
+import crawl_engine
 
 # Initialize MCP server
 app = Server("web-scraper")
@@ -109,12 +111,13 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             
             # Extract text
             text = scraper.extract_text(html, content_type)
-            content_hash = analyzer.calculate_hash(text)
+            # Same normalized hash the crawler stores, so timestamps and tokens don't look like changes
+            content_hash, _ = content_fingerprint.fingerprint(text)
             
             # Generate summary if API key provided
             summary = None
             if api_key:
-                summary = analyzer.summarize(text, api_key)
+                summary = analyzer.summarize(text, api_key, content_hash=content_hash)
             
             result = {
                 "url": url,
@@ -144,42 +147,21 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
         try:
             # Crawl the website
             pages_data = []
-            visited = set()
-            to_visit = [root_url]
-            
-            while to_visit and len(visited) < max_pages:
-                current_url = to_visit.pop(0)
-                if current_url in visited:
-                    continue
-                
-                visited.add(current_url)
-                
-                # Fetch and process page
-                html, content_type = scraper.fetch_page(current_url)
-                if not html:
-                    continue
-                
-                text = scraper.extract_text(html, content_type)
-                content_hash = analyzer.calculate_hash(text)
-                
+
+            def summarize_and_collect(page):
                 # Generate summary if API key provided
                 summary = None
                 if api_key:
-                    summary = analyzer.summarize(text, api_key)
-                
+                    summary = analyzer.summarize(page.text, api_key, content_hash=page.content_hash)
+
                 pages_data.append({
-                    "url": current_url,
-                    "content_hash": content_hash,
-                    "text_length": len(text),
+                    "url": page.url,
+                    "content_hash": page.content_hash,
+                    "text_length": len(page.text),
                     "summary": summary
                 })
-                
-                # Find new links to visit
-                if content_type == "html":
-                    internal_links = scraper.find_links(html, current_url)
-                    for link in internal_links:
-                        if link not in visited and link not in to_visit:
-                            to_visit.append(link)
+
+            crawl_engine.CrawlEngine(root_url, stages=[summarize_and_collect], max_pages=max_pages).run()
             
             result = {
                 "root_url": root_url,
@@ -0,0 +1,139 @@
+"""
+Politeness scheduler.
+Keeps a TTL-refreshed robots.txt cache per host and a token bucket per host
+that honors Crawl-delay, so concurrent crawls space out requests to the same
+site without slowing down requests to other sites.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+import requests
+
+ROBOTS_TTL = 24 * 3600  # Refresh robots.txt daily
+ROBOTS_TIMEOUT = 10
+ROBOTS_USER_AGENT = '*'  # We rotate user agents, so match the wildcard group
+DEFAULT_CRAWL_DELAY = 0.5  # Seconds between requests when robots.txt sets no Crawl-delay
+DEFAULT_BURST = 2  # Requests allowed back-to-back when no Crawl-delay is set
+MAX_CRAWL_DELAY = 60  # Ignore absurd Crawl-delay values beyond this
+RESPECT_ROBOTS = True
+
+class RobotsCache:
+    """Per-host robots.txt cache with TTL refresh."""
+
+    def __init__(self, ttl=ROBOTS_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, base):
+        parser = RobotFileParser(f"{base}/robots.txt")
+        try:
+            response = requests.get(f"{base}/robots.txt", timeout=ROBOTS_TIMEOUT,
+                                    headers={'User-Agent': 'Mozilla/5.0 (compatible; WebMonitor)'})
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except Exception as e:
+            print(f"Could not fetch robots.txt for {base}: {e}")
+            parser.allow_all = True
+        return parser
+
+    def get(self, url):
+        """Return the RobotFileParser for the URL's host, fetching it if stale."""
+        parsed = urlparse(url)
+        base = f"{parsed.scheme}://{parsed.netloc}"
+        with self._lock:
+            entry = self._entries.get(base)
+        if entry and time.time() - entry[1] < self.ttl:
+            return entry[0]
+
+        parser = self._fetch(base)
+        with self._lock:
+            self._entries[base] = (parser, time.time())
+        return parser
+
+    def can_fetch(self, url):
+        return self.get(url).can_fetch(ROBOTS_USER_AGENT, url)
+
+    def crawl_delay(self, url):
+        delay = self.get(url).crawl_delay(ROBOTS_USER_AGENT)
+        if delay is None:
+            return None
+        return min(float(delay), MAX_CRAWL_DELAY)
+
+    def sitemaps(self, url):
+        return self.get(url).site_maps() or []
+
+class HostBucket:
+    """Token bucket for one host; negative tokens are reserved future slots."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.requests = 0
+        self.total_wait = 0.0
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait for it."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        self.requests += 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        self.total_wait += wait
+        return wait
+
+class PolitenessScheduler:
+    """Spaces out requests per host according to robots.txt Crawl-delay."""
+
+    def __init__(self, robots=None):
+        self.robots = robots or RobotsCache()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        delay = self.robots.crawl_delay(url)
+        if delay:
+            rate, capacity = 1.0 / delay, 1
+        else:
+            rate, capacity = 1.0 / DEFAULT_CRAWL_DELAY, DEFAULT_BURST
+
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = HostBucket(rate, capacity)
+        elif bucket.rate != rate:
+            # robots.txt was refreshed with a different Crawl-delay
+            bucket.rate, bucket.capacity = rate, capacity
+        return bucket
+
+    def wait(self, url):
+        """Block until this host may be contacted again; returns seconds waited."""
+        self.robots.get(url)  # Warm the robots cache outside the scheduler lock
+        with self._lock:
+            delay = self._bucket(url).reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def can_fetch(self, url):
+        """True if robots.txt allows crawling the URL (always True if disabled)."""
+        if not RESPECT_ROBOTS:
+            return True
+        return self.robots.can_fetch(url)
+
+    def stats(self):
+        with self._lock:
+            return {host: {
+                "requests_per_second": round(bucket.rate, 3),
+                "requests": bucket.requests,
+                "total_wait": round(bucket.total_wait, 2)
+            } for host, bucket in self._buckets.items()}
@@ -0,0 +1,191 @@
+"""
+Health-scored proxy pool.
+Tracks success rate, latency and ban signals per proxy and per target host,
+picks proxies by weighted score and quarantines bad ones with exponential backoff.
+"""
+
+import random
+import threading
+import time
+
+# Responses that usually mean the proxy IP is blocked by the target
+BAN_STATUS_CODES = {403, 407, 429}
+# Bot-wall interstitials served with a 200; a page that merely embeds a CAPTCHA
+# widget (g-recaptcha, recaptcha/api.js on a form) is not one of these
+CHALLENGE_SIGNATURES = [
+    '<title>just a moment...</title>',  # Cloudflare
+    '<title>attention required! | cloudflare</title>',
+    'window._cf_chl_opt',
+    '_incapsula_resource',  # Imperva
+    'px-captcha',  # PerimeterX / HUMAN
+    'captcha-delivery.com',  # DataDome
+    'our systems have detected unusual traffic from your computer network',  # Google
+    '<title>access denied</title>'  # Akamai
+]
+CHALLENGE_SCAN_CHARS = 5000
+
+QUARANTINE_AFTER_FAILURES = 3  # Consecutive failures before a proxy is benched
+BASE_QUARANTINE_SECONDS = 30
+MAX_QUARANTINE_SECONDS = 3600
+LATENCY_SMOOTHING = 0.3  # EWMA weight of the newest latency sample
+
+def looks_banned(status_code, body=''):
+    """Return True if a response looks like an IP ban / bot wall (ban status or challenge page)."""
+    if status_code in BAN_STATUS_CODES:
+        return True
+    snippet = (body or '')[:CHALLENGE_SCAN_CHARS].lower()
+    return any(signature in snippet for signature in CHALLENGE_SIGNATURES)
+
+def mask_proxy(proxy):
+    """Hide credentials in a proxy URL before exposing it."""
+    if '@' not in proxy:
+        return proxy
+    scheme, _, rest = proxy.rpartition('//')
+    return f"{scheme}//***@{rest.split('@', 1)[1]}"
+
+class ProxyHealth:
+    """Rolling health counters for one proxy (optionally scoped to one host)."""
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.bans = 0
+        self.consecutive_failures = 0
+        self.avg_latency = None
+        self.quarantine_count = 0
+        self.quarantined_until = 0.0
+
+    def record_success(self, latency):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.quarantine_count = max(0, self.quarantine_count - 1)
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.avg_latency
+
+    def record_failure(self, banned=False):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if banned:
+            self.bans += 1
+        if banned or self.consecutive_failures >= QUARANTINE_AFTER_FAILURES:
+            self.quarantine()
+
+    def quarantine(self):
+        backoff = min(BASE_QUARANTINE_SECONDS * (2 ** self.quarantine_count), MAX_QUARANTINE_SECONDS)
+        self.quarantine_count += 1
+        self.consecutive_failures = 0
+        self.quarantined_until = time.time() + backoff
+
+    def is_quarantined(self, now=None):
+        return (now or time.time()) < self.quarantined_until
+
+    def score(self):
+        """Higher is better: smoothed success rate, penalised by latency and bans."""
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        latency_factor = 1.0 / (1.0 + (self.avg_latency or 1.0))
+        ban_factor = 1.0 / (1.0 + self.bans)
+        return success_rate * latency_factor * ban_factor
+
+    def to_dict(self):
+        total = self.successes + self.failures
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "bans": self.bans,
+            "success_rate": round(self.successes / total, 3) if total else None,
+            "avg_latency": round(self.avg_latency, 3) if self.avg_latency is not None else None,
+            "quarantined": self.is_quarantined(),
+            "quarantined_until": self.quarantined_until if self.is_quarantined() else None,
+            "score": round(self.score(), 4)
+        }
+
+class ProxyPool:
+    """Thread-safe proxy selector shared by the requests and Playwright fetch paths."""
+
+    def __init__(self, proxies=None):
+        self._lock = threading.Lock()
+        self._proxies = []
+        self._health = {}
+        self._host_health = {}
+        self.set_proxies(proxies or [])
+
+    def set_proxies(self, proxies):
+        """Replace the proxy list, keeping health data for proxies that remain."""
+        with self._lock:
+            self._proxies = list(proxies)
+            for proxy in self._proxies:
+                self._health.setdefault(proxy, ProxyHealth())
+
+    def _host_entry(self, proxy, host):
+        key = (proxy, host)
+        if key not in self._host_health:
+            self._host_health[key] = ProxyHealth()
+        return self._host_health[key]
+
+    def choose(self, host=None):
+        """Pick a proxy by weighted score, skipping quarantined ones."""
+        with self._lock:
+            if not self._proxies:
+                return None
+
+            now = time.time()
+            candidates = []
+            for proxy in self._proxies:
+                health = self._health[proxy]
+                host_health = self._host_health.get((proxy, host)) if host else None
+                if health.is_quarantined(now) or (host_health and host_health.is_quarantined(now)):
+                    continue
+                weight = health.score()
+                if host_health:
+                    weight *= host_health.score() * 2  # Host-specific history dominates
+                candidates.append((proxy, weight))
+
+            if not candidates:
+                # Everything is benched - use whichever proxy comes back soonest
+                def release_time(proxy):
+                    host_health = self._host_health.get((proxy, host))
+                    return max(self._health[proxy].quarantined_until,
+                               host_health.quarantined_until if host_health else 0)
+                return min(self._proxies, key=release_time)
+
+            proxies, weights = zip(*candidates)
+            return random.choices(proxies, weights=weights, k=1)[0]
+
+    def report_success(self, proxy, host, latency):
+        if not proxy:
+            return
+        with self._lock:
+            self._health.setdefault(proxy, ProxyHealth()).record_success(latency)
+            if host:
+                self._host_entry(proxy, host).record_success(latency)
+
+    def report_failure(self, proxy, host, banned=False):
+        if not proxy:
+            return
+        with self._lock:
+            health = self._health.setdefault(proxy, ProxyHealth())
+            if banned and host:
+                # A ban is usually specific to the target site
+                self._host_entry(proxy, host).record_failure(banned=True)
+                health.bans += 1
+                health.failures += 1
+            else:
+                health.record_failure()
+                if host:
+                    self._host_entry(proxy, host).record_failure()
+
+    def stats(self):
+        """Return pool statistics for dashboards."""
+        with self._lock:
+            per_host = {}
+            for (proxy, host), health in self._host_health.items():
+                per_host.setdefault(proxy, {})[host] = health.to_dict()
+            proxies = {mask_proxy(proxy): dict(self._health[proxy].to_dict(), hosts=per_host.get(proxy, {}))
+                       for proxy in self._proxies}
+            return {
+                "total": len(self._proxies),
+                "available": sum(1 for p in self._proxies if not self._health[p].is_quarantined()),
+                "proxies": proxies
+            }
@@ -5,7 +5,15 @@ import threading
 class SchedulerService:
     def __init__(self):
         self.cease_continuous_run = threading.Event()
-        self._start_background_thread()
+        self.continuous_thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started on the first job rather than at construction, so importing app
+        # (e.g. in spawned extract_pool workers) does not leave a thread running
+        with self._start_lock:
+            if self.continuous_thread is None:
+                self._start_background_thread()
 
     def _start_background_thread(self):
         class ScheduleThread(threading.Thread):
@@ -20,6 +28,7 @@ class SchedulerService:
 
     def add_job(self, root_url, interval_val, interval_unit, job_func, *args):
         """Add or update a job for a specific root URL."""
+        self._ensure_started()
         # Remove existing job for this tag first
         schedule.clear(root_url)
         
@@ -3,14 +3,36 @@ Simple REST API wrapper for web scraping - designed for n8n integration.
 No MCP dependency required - just a clean HTTP API.
 """
 
+from concurrent.futures import Future
+import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import scraper
 import analyzer
+import content_fingerprint
+import chat_index
+import crawl_engine
+import extract_pool
+import diff_engine
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+OFFLOAD_EXTRACTION = True  # Parse crawled pages in worker processes, off the request threads
+MAX_WORKERS = 16
+
+def parse_workers(value):
+    """Validate the 'workers' request field: an integer >= 1 (capped at MAX_WORKERS), else None."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        workers = int(value)
+    except (TypeError, ValueError):
+        return None
+    if workers < 1 or workers != float(value):
+        return None
+    return min(workers, MAX_WORKERS)
+
 @app.route('/scrape', methods=['POST'])
 def scrape_url():
     """
@@ -20,8 +42,9 @@ def scrape_url():
     {
         "url": "https://example.com",
         "api_key": "sk-...", // Optional for AI summary
-        "render_js": true,   // Optional: Use Headless Browser
-        "use_proxy": true    // Optional: Use Proxy rotation
+        "render_js": true,   // Optional: true, false or "auto" (static first, browser only if needed)
+        "use_proxy": true,   // Optional: Use Proxy rotation
+        "hedge": true        // Optional: fire a duplicate request if the first is slow (default: true)
     }
     """
     data = request.json
@@ -29,24 +52,26 @@ def scrape_url():
     api_key = data.get('api_key')
     render_js = data.get('render_js', False)
     use_proxy = data.get('use_proxy', False)
+    hedge = data.get('hedge', True)
     
     if not url:
         return jsonify({"error": "URL is required"}), 400
     
     try:
         # Fetch the page
-        html, content_type = scraper.fetch_page(url, render_js=render_js, use_proxy=use_proxy)
+        html, content_type = scraper.fetch_page(url, render_js=render_js, use_proxy=use_proxy, hedge=hedge)
         if not html:
             return jsonify({"error": "Failed to fetch URL", "url": url}), 400
         
         # Extract text
         text = scraper.extract_text(html, content_type)
-        content_hash = analyzer.calculate_hash(text)
+        # Same normalized hash the crawler stores, so timestamps and tokens don't look like changes
+        content_hash, _ = content_fingerprint.fingerprint(text)
         
         # Generate summary if API key provided
         summary = None
         if api_key:
-            summary = analyzer.summarize(text, api_key)
+            summary = analyzer.summarize(text, api_key, content_hash=content_hash)
         
         result = {
             "success": True,
@@ -76,8 +101,9 @@ def scrape_complete():
         "url": "https://example.com",
         "max_pages": 50,        // Optional
         "api_key": "sk-...",    // Optional
-        "render_js": true,      // Optional
-        "use_proxy": true       // Optional
+        "render_js": true,      // Optional: true, false or "auto"
+        "use_proxy": true,      // Optional
+        "workers": 4            // Optional: pages fetched concurrently (default: 1)
     }
     """
     data = request.json
@@ -86,45 +112,28 @@ def scrape_complete():
     max_pages = data.get('max_pages', 50)
     render_js = data.get('render_js', False)
     use_proxy = data.get('use_proxy', False)
+    workers = parse_workers(data.get('workers', 1))
     
     if not root_url:
         return jsonify({"error": "URL is required"}), 400
+    if workers is None:
+        return jsonify({"error": "workers must be a positive integer"}), 400
     
     try:
         # Crawl the website
         pages_data = []
-        visited = set()
-        to_visit = [root_url]
-        
-        while to_visit and len(visited) < max_pages:
-            current_url = to_visit.pop(0)
-            if current_url in visited:
-                continue
-            
-            visited.add(current_url)
-            
-            # Fetch and process page
-            html, content_type = scraper.fetch_page(current_url, render_js=render_js, use_proxy=use_proxy)
-            if not html:
-                continue
-            
-            # Extract text
-            text = scraper.extract_text(html, content_type)
-            content_hash = analyzer.calculate_hash(text)
-            
+
+        def collect(page):
             pages_data.append({
-                "url": current_url,
-                "content_hash": content_hash,
-                "text_length": len(text),
-                "full_text": text
+                "url": page.url,
+                "content_hash": page.content_hash,
+                "text_length": len(page.text),
+                "full_text": page.text
             })
-            
-            # Find new links to visit
-            if content_type and 'html' in content_type.lower():
-                internal_links = scraper.get_internal_links(current_url, html, content_type)
-                for link in internal_links:
-                    if link not in visited and link not in to_visit:
-                        to_visit.append(link)
+
+        crawl_engine.CrawlEngine(root_url, on_page=collect, max_pages=max_pages, workers=workers,
+                                 render_js=render_js, use_proxy=use_proxy,
+                                 extract_pool=extract_pool.get_pool() if OFFLOAD_EXTRACTION else None).run()
         
         result = {
             "success": True,
@@ -148,59 +157,59 @@ def crawl_website():
     {
         "root_url": "https://example.com",
         "max_pages": 50,
-        "api_key": "sk-..." // Optional
+        "api_key": "sk-...", // Optional
+        "workers": 4         // Optional: pages processed concurrently (default: 1)
     }
     """
     data = request.json
     root_url = data.get('root_url')
     max_pages = data.get('max_pages', 50)
     api_key = data.get('api_key')
+    workers = parse_workers(data.get('workers', 1))
     
     if not root_url:
         return jsonify({"error": "root_url is required"}), 400
+    if workers is None:
+        return jsonify({"error": "workers must be a positive integer"}), 400
     
     try:
         # Crawl the website
         pages_data = []
-        visited = set()
-        to_visit = [root_url]
-        
-        while to_visit and len(visited) < max_pages:
-            current_url = to_visit.pop(0)
-            if current_url in visited:
-                continue
-            
-            visited.add(current_url)
-            
-            # Fetch and process page
-            html, content_type = scraper.fetch_page(current_url)
-            if not html:
-                continue
-            
-            text = scraper.extract_text(html, content_type)
-            content_hash = analyzer.calculate_hash(text)
-            
+        summaries = {}  # content_hash -> Future of its summary, so mirror pages are summarized once
+        summaries_lock = threading.Lock()
+
+        @crawl_engine.llm_stage
+        def summarize(page):
             # Generate summary if API key provided
-            summary = None
-            if api_key:
-                summary = analyzer.summarize(text, api_key)
-            
+            if not api_key:
+                page.data['summary'] = None
+                return
+            with summaries_lock:
+                future = summaries.get(page.content_hash)
+                owner = future is None
+                if owner:
+                    future = summaries[page.content_hash] = Future()
+            if owner:
+                # Concurrent mirrors of this page wait on the future instead of summarizing again
+                try:
+                    future.set_result(analyzer.summarize(page.text, api_key, content_hash=page.content_hash))
+                except Exception as e:
+                    future.set_exception(e)
+            page.data['summary'] = future.result()
+
+        def collect(page):
             pages_data.append({
-                "url": current_url,
-                "content_hash": content_hash,
-                "text_length": len(text),
-                "text_preview": text[:200] + "..." if len(text) > 200 else text,
-                "summary": summary
+                "url": page.url,
+                "content_hash": page.content_hash,
+                "text_length": len(page.text),
+                "text_preview": page.text[:200] + "..." if len(page.text) > 200 else page.text,
+                "summary": page.data['summary'],
+                "duplicate_of": page.duplicate_of
             })
-            
-            # Find new links to visit
-            if content_type and 'html' in content_type.lower():
-                internal_links = scraper.get_internal_links(current_url, html, content_type)
-                for link in internal_links:
-                    if link not in visited and link not in to_visit:
-                        to_visit.append(link)
-
 
+        crawl_engine.CrawlEngine(root_url, stages=[summarize], on_page=collect,
+                                 max_pages=max_pages, workers=workers,
+                                 extract_pool=extract_pool.get_pool() if OFFLOAD_EXTRACTION else None).run()
         
         result = {
             "success": True,
@@ -327,14 +336,23 @@ def chat_with_site():
     try:
         # If URL provided but no content, scrape it first
         if url and not content:
-            html, content_type = scraper.fetch_page(url, render_js=True) # Use JS render for best content
+            # Static first; the scraper escalates to the browser only for JS shells
+            html, content_type = scraper.fetch_page(url, render_js='auto')
             if html:
                 content = scraper.extract_text(html, content_type)
         
         if not content:
             return jsonify({"error": "No content provided and failed to scrape URL"}), 400
             
-        answer = analyzer.chat_with_content(content, query, api_key)
+        # Long pages are cut down to the chunks that best match the question
+        context = chat_index.build_text_context(content, query, source=url or "content")
+        prompt = f"""Use the website content below to answer the user's question accurately. If the answer is not in the content, say so.
+
+WEBSITE CONTENT{f" ({url})" if url else ""}:
+{context}
+
+USER QUESTION: {query}"""
+        answer = analyzer.chat_with_content(prompt, api_key)
         
         return jsonify({
             "success": True,
@@ -390,17 +408,16 @@ def take_screenshot():
 def generate_diff():
     """
     Generate a visual HTML diff between two text blocks.
+    Send "format": "json" for the structured diff (stats and hunks) instead.
     """
     data = request.json
     text1 = data.get('text1', '')
     text2 = data.get('text2', '')
     
-    import difflib
-    d = difflib.HtmlDiff()
-    # Generate HTML diff
-    html_diff = d.make_file(text1.splitlines(), text2.splitlines(), context=True, numlines=2)
-    
-    return html_diff
+    diff = diff_engine.diff_texts(text1, text2, context=2)
+    if data.get('format') == 'json':
+        return jsonify(diff)
+    return diff_engine.render_html(diff)
 
 @app.route('/linkedin-scrape', methods=['POST'])
 def linkedin_scrape():
@@ -442,6 +459,18 @@ def health_check():
     })
 
 
+@app.route('/proxies', methods=['GET'])
+def proxy_stats():
+    """Proxy pool health statistics."""
+    return jsonify(scraper.get_proxy_stats())
+
+
+@app.route('/latency', methods=['GET'])
+def latency_stats():
+    """Per-host latency histograms used for adaptive timeouts and hedging."""
+    return jsonify(scraper.get_latency_stats())
+
+
 @app.route('/info', methods=['GET'])
 def get_info():
     """Get API information and available endpoints."""
@@ -478,6 +507,14 @@ def get_info():
                 "method": "GET",
                 "description": "Health check"
             },
+            "/proxies": {
+                "method": "GET",
+                "description": "Proxy pool health statistics"
+            },
+            "/latency": {
+                "method": "GET",
+                "description": "Per-host latency histograms"
+            },
             "/info": {
                 "method": "GET",
                 "description": "API information"
@@ -509,6 +546,8 @@ if __name__ == '__main__':
     print("  POST /extract-links       - Extract links from URL")
     print("  POST /detect-content-type - Detect content type")
     print("  GET  /health              - Health check")
+    print("  GET  /proxies             - Proxy pool statistics")
+    print("  GET  /latency             - Per-host latency histograms")
     print("  GET  /info                - API information")
     print("\nReady for n8n integration!")
     print("=" * 60)
@@ -549,6 +549,47 @@ async function loadScreenshotGallery() {
 }
 
 // Visual Diff Functions
+function escapeHtml(text) {
+    return String(text)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
+
+// Render a structured diff ({stats, hunks, truncated}) from the diff service
+function renderDiff(diff) {
+    const { added, removed } = diff.stats;
+    if (!diff.hunks.length) {
+        return '<p style="text-align: center; padding: 20px; color: #666;">No differences found</p>';
+    }
+
+    const rowClass = { '+': 'diff_add', '-': 'diff_sub', ' ': '' };
+    let rows = '';
+    diff.hunks.forEach(hunk => {
+        rows += `<tr class="diff_header"><td colspan="3">@@ -${hunk.old_start},${hunk.old_lines} +${hunk.new_start},${hunk.new_lines} @@</td></tr>`;
+        let oldNo = hunk.old_start;
+        let newNo = hunk.new_start;
+        hunk.lines.forEach(([op, line]) => {
+            const left = op !== '+' ? oldNo++ : '';
+            const right = op !== '-' ? newNo++ : '';
+            rows += `<tr class="${rowClass[op]}"><td class="diff_lineno">${left}</td><td class="diff_lineno">${right}</td><td class="diff_text">${escapeHtml(op + ' ' + line)}</td></tr>`;
+        });
+    });
+    if (diff.truncated) {
+        rows += '<tr class="diff_header"><td colspan="3">… diff truncated</td></tr>';
+    }
+
+    return `
+        <div class="diff-result">
+            <p style="margin: 0 0 10px 0; font-size: 13px; color: #666;">
+                <span style="color: #2e7d32;">+${added}</span> / <span style="color: #c62828;">-${removed}</span> lines
+            </p>
+            <table><tbody>${rows}</tbody></table>
+        </div>
+    `;
+}
+
 async function generateDiff() {
     const text1 = document.getElementById('diffText1').value;
     const text2 = document.getElementById('diffText2').value;
@@ -569,8 +610,8 @@ async function generateDiff() {
         });
 
         if (response.ok) {
-            const diffHtml = await response.text();
-            resultDiv.innerHTML = diffHtml;
+            const diff = await response.json();
+            resultDiv.innerHTML = renderDiff(diff);
         } else {
             resultDiv.innerHTML = '<p style="color: red; text-align: center;">Error generating diff</p>';
         }
@@ -641,7 +682,7 @@ async function compareWebsiteVersions() {
                 <div>
                     <h4 style="margin: 0 0 10px 0; color: #2196F3;">📝 Text Diff</h4>
                     <div style="max-height: 600px; overflow-y: auto; border: 1px solid #ddd; border-radius: 8px;">
-                        ${data.diff_html}
+                        ${renderDiff(data.diff)}
                     </div>
                 </div>
             </div>
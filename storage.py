@@ -1,8 +1,39 @@
 
 import sqlite3
 import datetime
+import hashlib
+import uuid
+import json
+from urllib.parse import urlparse
+import canonical
+import content_fingerprint
 
 DB_NAME = "monitor.db"
+# Stored "summaries" that are really failures or the no-API-key preview; never reused or summarized further
+PLACEHOLDER_SUMMARY_PREFIXES = ("AI Summary Failed", "Master Summary Failed", "Preview:")
+# volatile_patterns row that opts a root in to content_fingerprint.DATE_PATTERNS (a regex comment, never applied)
+MASK_DATES_PATTERN = "(?#mask-dates)"
+
+# Adaptive per-page revisit intervals (seconds)
+DEFAULT_REVISIT_SECONDS = 3600  # Used when the root has no schedule
+MIN_REVISIT_SECONDS = 60
+MAX_REVISIT_SECONDS = 30 * 24 * 3600
+REVISIT_BACKOFF = 2.0  # Interval multiplier when a page did not change
+REVISIT_SPEEDUP = 0.5  # Interval multiplier when a page changed
+SCHEDULE_UNIT_SECONDS = {"seconds": 1, "minutes": 60, "hours": 3600, "days": 86400}
+
+# Shared crawl work queue (see worker.py)
+TASK_LEASE_SECONDS = 300  # A leased task is handed to another worker after this long
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_DELAY = 30  # Seconds before the first retry; doubles per attempt
+QUEUE_DB_TIMEOUT = 30  # Seconds to wait for the write lock held by another process
+
+# Change event analysis states (see change_analysis.py)
+CHANGE_PENDING = 'pending'
+CHANGE_PROCESSING = 'processing'
+CHANGE_DONE = 'done'
+CHANGE_FAILED = 'failed'
+CHANGE_LEASE_SECONDS = 600  # A claimed event is handed out again after this long
 
 def init_db():
     """Initialize the database with the necessary tables."""
@@ -24,18 +55,45 @@ def init_db():
                 content_hash TEXT,
                 last_scraped TIMESTAMP,
                 summary TEXT,
-                root_url TEXT
+                root_url TEXT,
+                revisit_interval INTEGER,
+                next_due_at TIMESTAMP,
+                simhash TEXT,
+                fingerprint_version INTEGER,
+                text_hash TEXT
             )
         ''')
+
+    # Check if pages has the adaptive revisit columns
+    cursor.execute("PRAGMA table_info(pages)")
+    columns = [info[1] for info in cursor.fetchall()]
+    if 'next_due_at' not in columns:
+        print("Migrating database: Adding revisit columns to pages...")
+        cursor.execute("ALTER TABLE pages ADD COLUMN revisit_interval INTEGER")
+        cursor.execute("ALTER TABLE pages ADD COLUMN next_due_at TIMESTAMP")
+    if 'simhash' not in columns:
+        print("Migrating database: Adding simhash column to pages...")
+        cursor.execute("ALTER TABLE pages ADD COLUMN simhash TEXT")
+    if 'fingerprint_version' not in columns:
+        print("Migrating database: Adding fingerprint_version column to pages...")
+        cursor.execute("ALTER TABLE pages ADD COLUMN fingerprint_version INTEGER")
+    if 'text_hash' not in columns:
+        print("Migrating database: Adding text_hash column to pages...")
+        cursor.execute("ALTER TABLE pages ADD COLUMN text_hash TEXT")
     
     # Create site_summaries table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS site_summaries (
             root_url TEXT PRIMARY KEY,
             summary TEXT,
-            last_updated TIMESTAMP
+            last_updated TIMESTAMP,
+            source_hash TEXT
         )
     ''')
+    cursor.execute("PRAGMA table_info(site_summaries)")
+    if 'source_hash' not in [info[1] for info in cursor.fetchall()]:
+        print("Migrating database: Adding source_hash column to site_summaries...")
+        cursor.execute("ALTER TABLE site_summaries ADD COLUMN source_hash TEXT")
 
     # Create schedules table
     cursor.execute('''
@@ -70,9 +128,33 @@ def init_db():
             detected_at TIMESTAMP,
             change_type TEXT,
             relevance_score INTEGER,
-            diff_summary TEXT
+            diff_summary TEXT,
+            analysis_status TEXT,
+            old_history_id INTEGER,
+            new_history_id INTEGER,
+            lines_added INTEGER,
+            lines_removed INTEGER,
+            changed_sections TEXT,
+            analyzed_at TIMESTAMP
         )
     ''')
+
+    # Check if change_events has the precomputed analysis columns
+    cursor.execute("PRAGMA table_info(change_events)")
+    columns = [info[1] for info in cursor.fetchall()]
+    if 'analysis_status' not in columns:
+        print("Migrating database: Adding analysis columns to change_events...")
+        for column, column_type in [("analysis_status", "TEXT"), ("old_history_id", "INTEGER"),
+                                    ("new_history_id", "INTEGER"), ("lines_added", "INTEGER"),
+                                    ("lines_removed", "INTEGER"), ("changed_sections", "TEXT"),
+                                    ("analyzed_at", "TIMESTAMP")]:
+            cursor.execute(f"ALTER TABLE change_events ADD COLUMN {column} {column_type}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_events_status ON change_events (analysis_status)")
+    # Queued events have no relevance until analyzed (older rows carried a placeholder 5)
+    cursor.execute('''
+        UPDATE change_events SET relevance_score = NULL
+        WHERE analysis_status IN ('pending', 'processing') AND relevance_score IS NOT NULL
+    ''')
     
     # Create scrape_history table
     cursor.execute('''
@@ -113,6 +195,81 @@ def init_db():
         )
     ''')
     
+    # Create render_decisions table (adaptive static/JS rendering per URL)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS render_decisions (
+            url TEXT PRIMARY KEY,
+            mode TEXT,
+            decided_at TIMESTAMP
+        )
+    ''')
+    
+    # Create crawl_state tables (checkpoints of in-progress crawls, resumed on startup)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            root_url TEXT PRIMARY KEY,
+            capture_screenshots BOOLEAN,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_state_urls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            root_url TEXT,
+            url TEXT,
+            depth INTEGER,
+            visited BOOLEAN DEFAULT 0,
+            UNIQUE(root_url, url)
+        )
+    ''')
+    
+    # Create summary_cache table (LLM summaries keyed by content, model and prompt version)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS summary_cache (
+            content_hash TEXT,
+            model TEXT,
+            prompt_version INTEGER,
+            summary TEXT,
+            created_at TIMESTAMP,
+            last_used_at TIMESTAMP,
+            PRIMARY KEY (content_hash, model, prompt_version)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_summary_cache_lru ON summary_cache (last_used_at)")
+
+    # Create crawl_tasks table (durable work queue drained by worker.py processes)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            crawl_id TEXT,
+            root_url TEXT,
+            url TEXT,
+            depth INTEGER,
+            mode TEXT,
+            capture_screenshots BOOLEAN,
+            max_pages INTEGER,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            available_at TIMESTAMP,
+            lease_owner TEXT,
+            lease_expires_at TIMESTAMP,
+            last_error TEXT,
+            updated_at TIMESTAMP,
+            UNIQUE(crawl_id, url)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_tasks_status ON crawl_tasks (status, depth, id)")
+
+    # Create volatile_patterns table (per-root regexes masked before fingerprinting)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS volatile_patterns (
+            root_url TEXT,
+            pattern TEXT,
+            PRIMARY KEY (root_url, pattern)
+        )
+    ''')
+    
     # Check if scrape_history has content column
     cursor.execute("PRAGMA table_info(scrape_history)")
     columns = [info[1] for info in cursor.fetchall()]
@@ -120,17 +277,77 @@ def init_db():
         print("Migrating database: Adding content column to scrape_history...")
         cursor.execute("ALTER TABLE scrape_history ADD COLUMN content TEXT")
 
+    _canonicalize_page_urls(cursor)
+    _backfill_fingerprints(cursor)
+
     conn.commit()
+    # WAL lets worker processes read while another one writes
+    cursor.execute("PRAGMA journal_mode=WAL")
     conn.close()
 
 # ... (rest of init_db is fine, just added migration at end of init_db or inside)
     # Actually, I should put it inside init_db before commit.
 
+def _canonicalize_page_urls(cursor):
+    """
+    Data migration: re-key pages stored under a non-canonical spelling (trailing
+    slash, unsorted query, tracking params) to the canonical URL the crawler now
+    uses, so recrawls update the existing row and its history. If the canonical
+    row already exists, the legacy row's history is merged into it.
+    """
+    cursor.execute("SELECT url, root_url FROM pages")
+    renames = []
+    for url, root_url in cursor.fetchall():
+        if url == root_url:
+            continue  # Start URLs keep the spelling the crawl was started with
+        canonical_url = canonical.canonicalize(url, urlparse(root_url or url).netloc)
+        if canonical_url != url:
+            renames.append((url, canonical_url))
+    if not renames:
+        return
+    print(f"Migrating database: Canonicalizing {len(renames)} page URL(s)...")
+    for url, canonical_url in renames:
+        cursor.execute("SELECT 1 FROM pages WHERE url = ?", (canonical_url,))
+        if cursor.fetchone():
+            cursor.execute("DELETE FROM pages WHERE url = ?", (url,))
+        else:
+            cursor.execute("UPDATE pages SET url = ? WHERE url = ?", (canonical_url, url))
+        cursor.execute("UPDATE scrape_history SET url = ? WHERE url = ?", (canonical_url, url))
+        cursor.execute("UPDATE change_events SET page_url = ? WHERE page_url = ?", (canonical_url, url))
+        cursor.execute("UPDATE scrape_runs SET page_url = ? WHERE page_url = ?", (canonical_url, url))
+        cursor.execute("UPDATE OR IGNORE render_decisions SET url = ? WHERE url = ?", (canonical_url, url))
+        cursor.execute("DELETE FROM render_decisions WHERE url = ?", (url,))
+
+def _backfill_fingerprints(cursor):
+    """
+    Data migration: pages saved before content fingerprinting store a hash of the
+    raw text and no SimHash, and pages fingerprinted by an older normalize() (or
+    with since-edited volatile patterns) hold hashes the next crawl can't match.
+    Recompute both from the latest stored content so the first recrawl compares
+    like with like instead of flagging every page changed.
+    """
+    cursor.execute('''
+        SELECT p.url, p.root_url, h.content FROM pages p
+        JOIN scrape_history h ON h.id = (SELECT MAX(id) FROM scrape_history WHERE url = p.url)
+        WHERE (p.simhash IS NULL OR p.fingerprint_version IS NOT ?) AND h.content IS NOT NULL
+    ''', (content_fingerprint.NORMALIZATION_VERSION,))
+    rows = cursor.fetchall()
+    if not rows:
+        return
+    print(f"Migrating database: Fingerprinting {len(rows)} page(s)...")
+    patterns = {}
+    for url, root_url, content in rows:
+        if root_url not in patterns:
+            patterns[root_url] = _volatile_patterns(cursor, root_url)
+        content_hash, simhash = content_fingerprint.fingerprint(content, patterns[root_url])
+        cursor.execute("UPDATE pages SET content_hash = ?, simhash = ?, fingerprint_version = ? WHERE url = ?",
+                       (content_hash, simhash, content_fingerprint.NORMALIZATION_VERSION, url))
+
 def get_page(url):
     """Retrieve a page's data by URL."""
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
-    cursor.execute("SELECT url, content_hash, last_scraped, summary, root_url FROM pages WHERE url = ?", (url,))
+    cursor.execute("SELECT url, content_hash, last_scraped, summary, root_url, simhash FROM pages WHERE url = ?", (url,))
     row = cursor.fetchone()
     conn.close()
     if row:
@@ -139,10 +356,26 @@ def get_page(url):
             "content_hash": row[1],
             "last_scraped": row[2],
             "summary": row[3],
-            "root_url": row[4]
+            "root_url": row[4],
+            "simhash": row[5]
         }
     return None
 
+def get_reusable_summary(url, content_hash, simhash, word_count=0):
+    """
+    Stored summary of url if it still describes this content: the normalized
+    hash is unchanged, or (long pages only) the SimHash is within
+    content_fingerprint.simhash_threshold(word_count) of the summarized version.
+    """
+    page = get_page(url)
+    if not page or not page["summary"] or page["summary"].startswith(PLACEHOLDER_SUMMARY_PREFIXES):
+        return None
+    if page["content_hash"] == content_hash:
+        return page["summary"]
+    if content_fingerprint.is_significant_change(page["simhash"], simhash, word_count):
+        return None
+    return page["summary"]
+
 def log_scrape_run(root_url, page_url, started_at, finished_at, status, bytes_fetched, change_detected):
     """Log a scrape run execution."""
     conn = sqlite3.connect(DB_NAME)
@@ -154,30 +387,140 @@ def log_scrape_run(root_url, page_url, started_at, finished_at, status, bytes_fe
     conn.commit()
     conn.close()
 
-def log_change_event(root_url, page_url, change_type="content_update", relevance_score=5, diff_summary="Content changed"):
-    """Log a detected change event."""
+def log_change_event(root_url, page_url, change_type="content_update", relevance_score=5, diff_summary="Content changed",
+                     old_history_id=None, new_history_id=None):
+    """
+    Log a detected change event and return its id.
+    With both history ids the event is queued ('pending') for change_analysis,
+    which fills in the diff stats, changed sections, relevance and summary;
+    until then its relevance_score is NULL, so min_relevance filters skip it.
+    """
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
     detected_at = datetime.datetime.now().isoformat()
+    status = CHANGE_PENDING if old_history_id and new_history_id else None
+    if status == CHANGE_PENDING:
+        relevance_score = None
     cursor.execute('''
-        INSERT INTO change_events (root_url, page_url, detected_at, change_type, relevance_score, diff_summary)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (root_url, page_url, detected_at, change_type, relevance_score, diff_summary))
+        INSERT INTO change_events (root_url, page_url, detected_at, change_type, relevance_score, diff_summary,
+                                   analysis_status, old_history_id, new_history_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (root_url, page_url, detected_at, change_type, relevance_score, diff_summary,
+          status, old_history_id, new_history_id))
+    event_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    return event_id
+
+def claim_change_events(root_url=None, limit=10, lease_seconds=CHANGE_LEASE_SECONDS):
+    """
+    Atomically take up to limit pending change events for analysis (stale claims
+    are handed out again). Returns dicts with the old and new page text.
+    """
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    now = datetime.datetime.now()
+    stale = (now - datetime.timedelta(seconds=lease_seconds)).isoformat()
+    root_filter = "AND e.root_url = ?" if root_url else ""
+    params = [CHANGE_PENDING, CHANGE_PROCESSING, stale] + ([root_url] if root_url else []) + [limit]
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(f'''
+            SELECT e.id, e.root_url, e.page_url, old.content AS old_content, new.content AS new_content
+            FROM change_events e
+            LEFT JOIN scrape_history old ON old.id = e.old_history_id
+            LEFT JOIN scrape_history new ON new.id = e.new_history_id
+            WHERE (e.analysis_status = ? OR (e.analysis_status = ? AND e.analyzed_at < ?)) {root_filter}
+            ORDER BY e.id LIMIT ?
+        ''', params)
+        rows = [dict(row) for row in cursor.fetchall()]
+        cursor.executemany("UPDATE change_events SET analysis_status = ?, analyzed_at = ? WHERE id = ?",
+                           [(CHANGE_PROCESSING, now.isoformat(), row["id"]) for row in rows])
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return rows
+
+def complete_change_event(event_id, relevance_score, diff_summary, lines_added, lines_removed, changed_sections,
+                          status=CHANGE_DONE):
+    """Store the precomputed analysis of a change event. changed_sections is JSON-serializable."""
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT)
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE change_events
+        SET relevance_score = ?, diff_summary = ?, lines_added = ?, lines_removed = ?, changed_sections = ?,
+            analysis_status = ?, analyzed_at = ?
+        WHERE id = ?
+    ''', (relevance_score, diff_summary, lines_added, lines_removed, json.dumps(changed_sections),
+          status, datetime.datetime.now().isoformat(), event_id))
+    conn.commit()
+    conn.close()
+
+def get_recently_changed_pages(root_url, limit=10):
+    """URLs of a root's pages with change events, most recently changed first."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT page_url FROM change_events WHERE root_url = ?
+        GROUP BY page_url ORDER BY MAX(id) DESC LIMIT ?
+    ''', (root_url, limit))
+    urls = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return urls
+
+def get_change_events(root_url=None, limit=50, min_relevance=None):
+    """Recent change events, newest first, with their precomputed analysis."""
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    clauses, params = [], []
+    if root_url:
+        clauses.append("root_url = ?")
+        params.append(root_url)
+    if min_relevance is not None:
+        clauses.append("relevance_score >= ?")
+        params.append(min_relevance)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cursor.execute(f'''
+        SELECT id, root_url, page_url, detected_at, change_type, relevance_score, diff_summary,
+               analysis_status, lines_added, lines_removed, changed_sections, analyzed_at
+        FROM change_events {where}
+        ORDER BY id DESC LIMIT ?
+    ''', params + [limit])
+    events = []
+    for row in cursor.fetchall():
+        event = dict(row)
+        event["changed_sections"] = json.loads(event["changed_sections"]) if event["changed_sections"] else []
+        events.append(event)
+    conn.close()
+    return events
 
-def save_page(url, content_hash, summary, text, root_url=None):
-    """Save or update a page's data and record history."""
+def save_page(url, content_hash, summary, text, root_url=None, simhash=None):
+    """
+    Save or update a page's data and record history.
+    Any change of the (normalized) content_hash counts as a change. pages.simhash
+    keeps the SimHash of the version the stored summary was written for, so
+    reused summaries are always compared with that version, not the last crawl.
+    """
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
     now = datetime.datetime.now().isoformat()
     
     # Check if content changed
-    cursor.execute("SELECT content_hash FROM pages WHERE url = ?", (url,))
+    cursor.execute("SELECT content_hash, revisit_interval, simhash, summary, fingerprint_version FROM pages WHERE url = ?",
+                   (url,))
     row = cursor.fetchone()
-    changed = False
-    if row and row[0] != content_hash:
-        changed = True
+    # Rows that predate fingerprinting (no simhash) or the current normalize() hold a
+    # hash computed differently; they are re-baselined on this save instead of being
+    # reported as changed
+    changed = bool(row and row[0] != content_hash and row[2] and row[4] == content_fingerprint.NORMALIZATION_VERSION)
+    previous_interval = row[1] if row else None
+    if row and row[2] and row[3] == summary:
+        simhash = row[2]  # Summary reused: keep the baseline it was written for
     
     # If root_url is not provided, try to keep existing one if updating
     if not root_url:
@@ -186,32 +529,518 @@ def save_page(url, content_hash, summary, text, root_url=None):
         if row:
             root_url = row[0]
     
+    # Adapt the revisit interval: back off while static, speed up on change
+    if previous_interval:
+        interval = previous_interval * (REVISIT_SPEEDUP if changed else REVISIT_BACKOFF)
+    else:
+        interval = _schedule_seconds(cursor, root_url)
+    interval = int(min(MAX_REVISIT_SECONDS, max(MIN_REVISIT_SECONDS, interval)))
+    next_due_at = (datetime.datetime.fromisoformat(now) + datetime.timedelta(seconds=interval)).isoformat()
+
     cursor.execute('''
-        INSERT INTO pages (url, content_hash, last_scraped, summary, root_url)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO pages (url, content_hash, last_scraped, summary, root_url, revisit_interval, next_due_at, simhash,
+                           fingerprint_version, text_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ON CONFLICT(url) DO UPDATE SET
             content_hash=excluded.content_hash,
             last_scraped=excluded.last_scraped,
             summary=excluded.summary,
-            root_url=COALESCE(excluded.root_url, pages.root_url)
-    ''', (url, content_hash, now, summary, root_url))
+            root_url=COALESCE(excluded.root_url, pages.root_url),
+            revisit_interval=excluded.revisit_interval,
+            next_due_at=excluded.next_due_at,
+            simhash=excluded.simhash,
+            fingerprint_version=excluded.fingerprint_version,
+            text_hash=excluded.text_hash
+    ''', (url, content_hash, now, summary, root_url, interval, next_due_at, simhash,
+          content_fingerprint.NORMALIZATION_VERSION, hashlib.sha256((text or '').encode('utf-8')).hexdigest()))
     
     # Save to history with content
+    cursor.execute("SELECT MAX(id) FROM scrape_history WHERE url = ?", (url,))
+    previous_history_id = cursor.fetchone()[0]
     cursor.execute('''
         INSERT INTO scrape_history (url, content_hash, scraped_at, summary, changed, content)
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (url, content_hash, now, summary, changed, text))
+    history_id = cursor.lastrowid
     
     conn.commit()
     conn.close()
     
-    # Log change event if changed
+    # Log change event if changed; change_analysis scores it off the request path
     if changed:
-        # We use a default score/summary for now, can be enhanced later
-        log_change_event(root_url, url, diff_summary=summary or "Content updated")
+        log_change_event(root_url, url, diff_summary="Change analysis pending",
+                         old_history_id=previous_history_id, new_history_id=history_id)
         
     return changed
 
+def _schedule_seconds(cursor, root_url):
+    """The root's schedule interval in seconds, used as a new page's first revisit interval."""
+    cursor.execute("SELECT interval_val, interval_unit FROM schedules WHERE root_url = ?", (root_url,))
+    row = cursor.fetchone()
+    if not row or not row[0]:
+        return DEFAULT_REVISIT_SECONDS
+    return row[0] * SCHEDULE_UNIT_SECONDS.get(row[1], 60)
+
+def get_due_pages(root_url, limit=None):
+    """Pages of a root URL whose next revisit is due, most overdue first."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    now = datetime.datetime.now().isoformat()
+    query = '''
+        SELECT url FROM pages
+        WHERE root_url = ? AND (next_due_at IS NULL OR next_due_at <= ?)
+        ORDER BY next_due_at
+    '''
+    params = (root_url, now)
+    if limit:
+        query += " LIMIT ?"
+        params += (limit,)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+def start_crawl_state(root_url, capture_screenshots=False):
+    """Register a new crawl checkpoint for a root URL, replacing any stale one."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    now = datetime.datetime.now().isoformat()
+    cursor.execute("DELETE FROM crawl_state_urls WHERE root_url = ?", (root_url,))
+    cursor.execute('''
+        INSERT INTO crawl_state (root_url, capture_screenshots, started_at, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(root_url) DO UPDATE SET
+            capture_screenshots=excluded.capture_screenshots,
+            started_at=excluded.started_at,
+            updated_at=excluded.updated_at
+    ''', (root_url, capture_screenshots, now, now))
+    conn.commit()
+    conn.close()
+
+def checkpoint_crawl_state(root_url, queued, visited):
+    """Persist one batch of frontier changes: newly queued (url, depth) pairs and finished URLs."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    now = datetime.datetime.now().isoformat()
+    cursor.executemany('''
+        INSERT OR IGNORE INTO crawl_state_urls (root_url, url, depth, visited)
+        VALUES (?, ?, ?, 0)
+    ''', [(root_url, url, depth) for url, depth in queued])
+    cursor.executemany('''
+        INSERT INTO crawl_state_urls (root_url, url, depth, visited)
+        VALUES (?, ?, 0, 1)
+        ON CONFLICT(root_url, url) DO UPDATE SET visited=1
+    ''', [(root_url, url) for url in visited])
+    cursor.execute("UPDATE crawl_state SET updated_at = ? WHERE root_url = ?", (now, root_url))
+    conn.commit()
+    conn.close()
+
+def get_crawl_state(root_url):
+    """
+    Load the checkpoint of an interrupted crawl.
+    Returns {"capture_screenshots", "queued": [(url, depth)], "visited": [url]}, or None
+    if there is no checkpoint or no URLs were checkpointed yet (nothing to resume from).
+    """
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT capture_screenshots FROM crawl_state WHERE root_url = ?", (root_url,))
+    row = cursor.fetchone()
+    if not row:
+        conn.close()
+        return None
+    cursor.execute("SELECT url, depth, visited FROM crawl_state_urls WHERE root_url = ? ORDER BY id", (root_url,))
+    rows = cursor.fetchall()
+    conn.close()
+    if not rows:
+        return None
+    return {
+        "capture_screenshots": bool(row[0]),
+        "queued": [(r[0], r[1]) for r in rows if not r[2]],
+        "visited": [r[0] for r in rows if r[2]]
+    }
+
+def get_unfinished_crawls():
+    """Map root URL -> capture_screenshots for every crawl that did not finish."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT root_url, capture_screenshots FROM crawl_state")
+    rows = cursor.fetchall()
+    conn.close()
+    return {r[0]: bool(r[1]) for r in rows}
+
+def clear_crawl_state(root_url):
+    """Drop a crawl's checkpoint once it has finished."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM crawl_state WHERE root_url = ?", (root_url,))
+    cursor.execute("DELETE FROM crawl_state_urls WHERE root_url = ?", (root_url,))
+    conn.commit()
+    conn.close()
+
+def get_cached_summary(content_hash, model, prompt_version, ttl_seconds=None):
+    """Look up a cached summary and refresh its LRU timestamp. Expired entries count as missing."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    now = datetime.datetime.now()
+    cursor.execute('''
+        SELECT summary, created_at FROM summary_cache
+        WHERE content_hash = ? AND model = ? AND prompt_version = ?
+    ''', (content_hash, model, prompt_version))
+    row = cursor.fetchone()
+    summary = None
+    if row and (not ttl_seconds or now - datetime.datetime.fromisoformat(row[1]) < datetime.timedelta(seconds=ttl_seconds)):
+        summary = row[0]
+        cursor.execute('''
+            UPDATE summary_cache SET last_used_at = ?
+            WHERE content_hash = ? AND model = ? AND prompt_version = ?
+        ''', (now.isoformat(), content_hash, model, prompt_version))
+        conn.commit()
+    conn.close()
+    return summary
+
+def save_cached_summary(content_hash, model, prompt_version, summary):
+    """Store an LLM summary for this content, model and prompt version."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    now = datetime.datetime.now().isoformat()
+    cursor.execute('''
+        INSERT INTO summary_cache (content_hash, model, prompt_version, summary, created_at, last_used_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(content_hash, model, prompt_version) DO UPDATE SET
+            summary=excluded.summary,
+            created_at=excluded.created_at,
+            last_used_at=excluded.last_used_at
+    ''', (content_hash, model, prompt_version, summary, now, now))
+    conn.commit()
+    conn.close()
+
+def evict_summary_cache(max_entries, ttl_seconds=None):
+    """Drop expired summaries, then the least recently used ones beyond max_entries. Returns rows deleted."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    deleted = 0
+    if ttl_seconds:
+        cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=ttl_seconds)).isoformat()
+        cursor.execute("DELETE FROM summary_cache WHERE created_at < ?", (cutoff,))
+        deleted += cursor.rowcount
+    cursor.execute('''
+        DELETE FROM summary_cache WHERE rowid IN (
+            SELECT rowid FROM summary_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+        )
+    ''', (max_entries,))
+    deleted += cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+def get_summary_cache_size():
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM summary_cache")
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def enqueue_crawl(root_url, urls=None, capture_screenshots=False, max_pages=20, mode="full"):
+    """
+    Queue a crawl for worker processes and return its crawl_id.
+    mode 'full' follows every internal link up to max_pages; 'due' (revisit
+    ticks) only adds links to pages that are not stored yet.
+    """
+    crawl_id = uuid.uuid4().hex
+    now = datetime.datetime.now().isoformat()
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT)
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT OR IGNORE INTO crawl_tasks
+            (crawl_id, root_url, url, depth, mode, capture_screenshots, max_pages, status, available_at, updated_at)
+        VALUES (?, ?, ?, 0, ?, ?, ?, 'queued', ?, ?)
+    ''', [(crawl_id, root_url, url, mode, capture_screenshots, max_pages, now, now) for url in (urls or [root_url])])
+    conn.commit()
+    conn.close()
+    return crawl_id
+
+def claim_task(worker_id, lease_seconds=TASK_LEASE_SECONDS):
+    """
+    Atomically lease the next task (shallowest first) to a worker.
+    Tasks whose lease expired are handed out again until they run out of attempts.
+    Returns the task as a dict, or None if nothing is available.
+    """
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    now = datetime.datetime.now()
+    now_iso = now.isoformat()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            UPDATE crawl_tasks SET status = 'failed', last_error = 'lease expired', updated_at = ?
+            WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?
+        ''', (now_iso, now_iso, TASK_MAX_ATTEMPTS))
+        cursor.execute('''
+            SELECT * FROM crawl_tasks
+            WHERE (status = 'queued' AND available_at <= ?)
+               OR (status = 'leased' AND lease_expires_at < ?)
+            ORDER BY depth, id LIMIT 1
+        ''', (now_iso, now_iso))
+        row = cursor.fetchone()
+        if row:
+            cursor.execute('''
+                UPDATE crawl_tasks
+                SET status = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            ''', (worker_id, (now + datetime.timedelta(seconds=lease_seconds)).isoformat(), now_iso, row["id"]))
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def complete_task(task_id, worker_id, links=()):
+    """
+    Mark a task done and queue its links, within the crawl's max_pages budget.
+    In 'due' mode the revisited pages (the depth-0 seeds) don't count against
+    that budget, so a revisit tick can still discover up to max_pages new pages.
+    Returns False (and changes nothing) if the task is gone or worker_id no longer
+    holds its lease, e.g. because it expired and another worker re-claimed the task.
+    """
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT, isolation_level=None)
+    cursor = conn.cursor()
+    now = datetime.datetime.now().isoformat()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            SELECT crawl_id, root_url, depth, mode, capture_screenshots, max_pages FROM crawl_tasks WHERE id = ?
+        ''', (task_id,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("COMMIT")
+            return False
+        crawl_id, root_url, depth, mode, capture_screenshots, max_pages = row
+        cursor.execute('''
+            UPDATE crawl_tasks SET status = 'done', lease_owner = NULL, last_error = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'leased'
+        ''', (now, task_id, worker_id))
+        if not cursor.rowcount:
+            cursor.execute("COMMIT")
+            return False
+
+        if mode == "due":
+            cursor.execute("SELECT COUNT(*) FROM crawl_tasks WHERE crawl_id = ? AND depth > 0", (crawl_id,))
+        else:
+            cursor.execute("SELECT COUNT(*) FROM crawl_tasks WHERE crawl_id = ?", (crawl_id,))
+        budget = max_pages - cursor.fetchone()[0]
+        for link in links:
+            if budget <= 0:
+                break
+            if mode == "due":
+                cursor.execute("SELECT 1 FROM pages WHERE url = ?", (link,))
+                if cursor.fetchone():
+                    continue
+            cursor.execute('''
+                INSERT OR IGNORE INTO crawl_tasks
+                    (crawl_id, root_url, url, depth, mode, capture_screenshots, max_pages, status, available_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)
+            ''', (crawl_id, root_url, link, depth + 1, mode, capture_screenshots, max_pages, now, now))
+            budget -= cursor.rowcount
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return True
+
+def fail_task(task_id, worker_id, error):
+    """
+    Record a failed attempt; the task is retried with exponential back-off until TASK_MAX_ATTEMPTS.
+    Returns the new status, or None if the task is gone or worker_id no longer holds its lease.
+    """
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT)
+    cursor = conn.cursor()
+    now = datetime.datetime.now()
+    cursor.execute("SELECT attempts FROM crawl_tasks WHERE id = ?", (task_id,))
+    row = cursor.fetchone()
+    if row is None:
+        conn.close()
+        return None
+    attempts = row[0]
+    if attempts >= TASK_MAX_ATTEMPTS:
+        status, available_at = "failed", None
+    else:
+        status = "queued"
+        available_at = (now + datetime.timedelta(seconds=TASK_RETRY_DELAY * 2 ** (attempts - 1))).isoformat()
+    cursor.execute('''
+        UPDATE crawl_tasks
+        SET status = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL, last_error = ?, updated_at = ?
+        WHERE id = ? AND lease_owner = ? AND status = 'leased'
+    ''', (status, available_at, error, now.isoformat(), task_id, worker_id))
+    updated = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return status if updated else None
+
+def has_active_crawl(root_url):
+    """True if a queued crawl of this root still has tasks queued or leased."""
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT 1 FROM crawl_tasks WHERE root_url = ? AND status IN ('queued', 'leased') LIMIT 1
+    ''', (root_url,))
+    active = cursor.fetchone() is not None
+    conn.close()
+    return active
+
+def finish_crawl(crawl_id):
+    """
+    Once no task of the crawl is queued or leased, delete its completed tasks
+    (failed ones are kept for inspection). Returns True only for the one
+    caller whose delete removed them, so a crawl is finalized exactly once.
+    """
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            SELECT COUNT(*) FROM crawl_tasks WHERE crawl_id = ? AND status IN ('queued', 'leased')
+        ''', (crawl_id,))
+        finished = False
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("DELETE FROM crawl_tasks WHERE crawl_id = ? AND status = 'done'", (crawl_id,))
+            finished = cursor.rowcount > 0
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return finished
+
+def get_queue_stats():
+    """Task counts per status plus the number of crawls still in progress."""
+    conn = sqlite3.connect(DB_NAME, timeout=QUEUE_DB_TIMEOUT)
+    cursor = conn.cursor()
+    cursor.execute("SELECT status, COUNT(*) FROM crawl_tasks GROUP BY status")
+    stats = {status: count for status, count in cursor.fetchall()}
+    cursor.execute("SELECT COUNT(DISTINCT crawl_id) FROM crawl_tasks WHERE status IN ('queued', 'leased')")
+    stats["active_crawls"] = cursor.fetchone()[0]
+    conn.close()
+    return stats
+
+def _volatile_patterns(cursor, root_url):
+    cursor.execute("SELECT pattern FROM volatile_patterns WHERE root_url = ? ORDER BY pattern", (root_url,))
+    patterns = [row[0] for row in cursor.fetchall()]
+    if MASK_DATES_PATTERN not in patterns:
+        return patterns
+    patterns.remove(MASK_DATES_PATTERN)
+    return content_fingerprint.DATE_PATTERNS + patterns
+
+def get_volatile_patterns(root_url):
+    """
+    Extra regexes masked out of this root's pages before fingerprinting: its own
+    patterns, plus content_fingerprint.DATE_PATTERNS if it opted in to date masking.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    patterns = _volatile_patterns(cursor, root_url)
+    conn.close()
+    return patterns
+
+def get_volatile_settings(root_url):
+    """A root's own volatile patterns and whether it masks absolute dates, as configured."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT pattern FROM volatile_patterns WHERE root_url = ? ORDER BY pattern", (root_url,))
+    patterns = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    mask_dates = MASK_DATES_PATTERN in patterns
+    if mask_dates:
+        patterns.remove(MASK_DATES_PATTERN)
+    return {"patterns": patterns, "mask_dates": mask_dates}
+
+def save_volatile_patterns(root_url, patterns, mask_dates=False):
+    """
+    Replace the volatile patterns configured for a root URL (mask_dates opts in to
+    DATE_PATTERNS). Its stored pages are re-fingerprinted so the change itself
+    doesn't show up as content changes on the next crawl.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM volatile_patterns WHERE root_url = ?", (root_url,))
+    cursor.executemany("INSERT OR IGNORE INTO volatile_patterns (root_url, pattern) VALUES (?, ?)",
+                       [(root_url, pattern) for pattern in patterns] +
+                       ([(root_url, MASK_DATES_PATTERN)] if mask_dates else []))
+    cursor.execute("UPDATE pages SET fingerprint_version = NULL WHERE root_url = ?", (root_url,))
+    _backfill_fingerprints(cursor)
+    conn.commit()
+    conn.close()
+
+def get_render_decision(url):
+    """Get the remembered render mode ('static' or 'js') for a URL."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT mode, decided_at FROM render_decisions WHERE url = ?", (url,))
+    row = cursor.fetchone()
+    conn.close()
+    if row:
+        return {"mode": row[0], "decided_at": row[1]}
+    return None
+
+def save_render_decision(url, mode):
+    """Remember whether a URL needs JS rendering."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    now = datetime.datetime.now().isoformat()
+    cursor.execute('''
+        INSERT INTO render_decisions (url, mode, decided_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            mode=excluded.mode,
+            decided_at=excluded.decided_at
+    ''', (url, mode, now))
+    conn.commit()
+    conn.close()
+
+def get_last_scraped_times(root_url):
+    """Map each page of a root URL to its last successful scrape timestamp."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT url, last_scraped FROM pages WHERE root_url = ?", (root_url,))
+    rows = cursor.fetchall()
+    conn.close()
+    return {r[0]: r[1] for r in rows}
+
+def get_page_change_stats(root_url):
+    """
+    Per-page change history for a root URL.
+    Returns {url: {"checks", "changes", "first_seen", "last_checked"}} built from
+    scrape_history and change_events.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT p.url, COUNT(h.id), COALESCE(SUM(h.changed), 0), MIN(h.scraped_at), MAX(h.scraped_at)
+        FROM pages p
+        LEFT JOIN scrape_history h ON h.url = p.url
+        WHERE p.root_url = ?
+        GROUP BY p.url
+    ''', (root_url,))
+    stats = {r[0]: {"checks": r[1], "changes": r[2], "first_seen": r[3], "last_checked": r[4]}
+             for r in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT page_url, COUNT(*) FROM change_events
+        WHERE root_url = ?
+        GROUP BY page_url
+    ''', (root_url,))
+    for url, events in cursor.fetchall():
+        if url in stats:
+            stats[url]["changes"] = max(stats[url]["changes"], events)
+    conn.close()
+    return stats
+
 def get_scrape_history(url, limit=10):
     """Get scrape history for a URL."""
     conn = sqlite3.connect(DB_NAME)
@@ -232,21 +1061,86 @@ def get_scrape_history(url, limit=10):
         "changed": bool(r[2])
     } for r in rows]
 
-def save_site_summary(root_url, summary):
-    """Save the master summary for a root URL."""
+def save_site_summary(root_url, summary, source_hash=None):
+    """
+    Save the master summary for a root URL.
+    source_hash identifies the page summaries it was built from (None forces the next rebuild).
+    """
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
     now = datetime.datetime.now().isoformat()
     cursor.execute('''
-        INSERT INTO site_summaries (root_url, summary, last_updated)
-        VALUES (?, ?, ?)
+        INSERT INTO site_summaries (root_url, summary, last_updated, source_hash)
+        VALUES (?, ?, ?, ?)
         ON CONFLICT(root_url) DO UPDATE SET
             summary=excluded.summary,
-            last_updated=excluded.last_updated
-    ''', (root_url, summary, now))
+            last_updated=excluded.last_updated,
+            source_hash=excluded.source_hash
+    ''', (root_url, summary, now, source_hash))
     conn.commit()
     conn.close()
 
+def get_site_summary(root_url):
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT summary FROM site_summaries WHERE root_url = ?", (root_url,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def get_page_hashes(root_url):
+    """
+    {url: hash of the raw stored text} for every page under root_url. Unlike the
+    normalized content_hash it also changes when only masked fragments (timestamps,
+    tokens) did, so indexes of the text itself can tell they are stale.
+    Rows saved before text_hash existed fall back to content_hash.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT url, COALESCE(text_hash, content_hash) FROM pages WHERE root_url = ?", (root_url,))
+    hashes = dict(cursor.fetchall())
+    conn.close()
+    return hashes
+
+def get_latest_contents(urls):
+    """{url: {"content", "summary", "last_scraped"}} from each URL's newest scrape_history row."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    contents = {}
+    urls = list(urls)
+    for start in range(0, len(urls), 500):  # Stay below SQLite's bound-parameter limit
+        batch = urls[start:start + 500]
+        cursor.execute(f'''
+            SELECT h.url, h.content, h.summary, h.scraped_at FROM scrape_history h
+            JOIN (SELECT url, MAX(id) AS id FROM scrape_history WHERE url IN ({",".join("?" * len(batch))}) GROUP BY url) latest
+              ON latest.id = h.id
+        ''', batch)
+        for url, content, summary, scraped_at in cursor.fetchall():
+            contents[url] = {"content": content or "", "summary": summary, "last_scraped": scraped_at}
+    conn.close()
+    return contents
+
+def get_site_summary_source_hash(root_url):
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT source_hash FROM site_summaries WHERE root_url = ?", (root_url,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def get_page_summaries(root_url):
+    """(url, summary) pairs for every summarized page under root_url, ordered by URL."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT url, summary FROM pages
+        WHERE root_url = ? AND summary IS NOT NULL AND summary != ''
+        ORDER BY url
+    ''', (root_url,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
 def save_schedule(root_url, interval_val, interval_unit, is_active):
     """Save or update a schedule."""
     conn = sqlite3.connect(DB_NAME)
@@ -277,7 +1171,7 @@ def get_pages_grouped():
     cursor = conn.cursor()
     
     # Get all pages
-    cursor.execute("SELECT url, last_scraped, summary, root_url FROM pages ORDER BY root_url, url")
+    cursor.execute("SELECT url, last_scraped, summary, root_url, next_due_at FROM pages ORDER BY root_url, url")
     rows = cursor.fetchall()
     
     # Get all site summaries
@@ -294,7 +1188,7 @@ def get_pages_grouped():
     
     grouped = {}
     for r in rows:
-        url, last_scraped, summary, root_url = r
+        url, last_scraped, summary, root_url, next_due_at = r
         # Fallback for old data without root_url
         group_key = root_url if root_url else "Uncategorized"
         
@@ -308,7 +1202,8 @@ def get_pages_grouped():
         grouped[group_key]["pages"].append({
             "url": url,
             "last_scraped": last_scraped,
-            "summary": summary
+            "summary": summary,
+            "next_due_at": next_due_at
         })
     return grouped
 
@@ -322,6 +1217,9 @@ def delete_root(root_url):
     cursor.execute("DELETE FROM schedules WHERE root_url = ?", (root_url,))
     cursor.execute("DELETE FROM scrape_runs WHERE root_url = ?", (root_url,))
     cursor.execute("DELETE FROM change_events WHERE root_url = ?", (root_url,))
+    cursor.execute("DELETE FROM crawl_state WHERE root_url = ?", (root_url,))
+    cursor.execute("DELETE FROM crawl_state_urls WHERE root_url = ?", (root_url,))
+    cursor.execute("DELETE FROM volatile_patterns WHERE root_url = ?", (root_url,))
     conn.commit()
     conn.close()
     return page_count
@@ -0,0 +1,335 @@
+"""
+Local vector index for semantic retrieval over page chunks.
+Chunk embeddings live in a float32 NumPy matrix, memory-mapped from
+VECTOR_DIR/<root>/, so indexes survive restarts without re-embedding. Chunk
+text and page hashes go to an append-only journal next to it, so persisting
+an update costs only the pages that changed. Pages are added and removed
+incrementally; deleted rows are masked until a compaction rewrites both files.
+Search is a blocked matrix-vector product over L2-normalized rows (cosine).
+
+The embedding function is pluggable (set_embedder); the default
+HashingEmbedder is deterministic and runs offline. An index built with a
+different embedder is discarded and rebuilt.
+"""
+
+from collections import Counter, OrderedDict, namedtuple
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import zlib
+import numpy as np
+
+VECTOR_DIR = "vector_index"
+VECTOR_DIM = 1024  # Hashing buckets; fewer means more collisions between features
+INITIAL_CAPACITY = 1024  # Rows; the matrix doubles when full
+SEARCH_BLOCK_ROWS = 16384  # Rows scored per matrix-vector product
+EMBED_BATCH = 256
+COMPACT_DEAD_FRACTION = 0.5  # Rewrite the matrix once this share of rows is deleted
+HASHING_MIN_SIMILARITY = 0.1  # Below this, HashingEmbedder matches are bucket collisions
+MAX_INDEXES = 16
+INDEX_FORMAT = 2  # On-disk layout; directories written in another format are rebuilt
+
+Hit = namedtuple("Hit", "url text last_scraped")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of words (3+ chars) and word bigrams with
+    log-scaled counts, L2-normalized. Deterministic across processes and runs.
+    """
+
+    def __init__(self, dim=VECTOR_DIM):
+        self.dim = dim
+        self.name = f"hashing-v1-{dim}"
+        self.min_similarity = HASHING_MIN_SIMILARITY
+
+    def __call__(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = [t for t in _TOKEN.findall(text.lower()) if len(t) > 2]
+            features = Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+            for feature, count in features.items():
+                h = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[row, h % self.dim] += sign * (1.0 + math.log(count))
+        return normalize(matrix)
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+_embedder = HashingEmbedder()
+
+def set_embedder(embedder):
+    """
+    Use another embedding function: a callable mapping a list of texts to an
+    (n, embedder.dim) float array, with a .name that changes whenever its
+    vectors do, and optionally a .min_similarity (cosine below which hits are
+    noise). Rows are normalized here, so any scale works.
+    """
+    global _embedder
+    _embedder = embedder
+    with _indexes_lock:
+        _indexes.clear()
+
+def get_embedder():
+    return _embedder
+
+class VectorIndex:
+    """
+    Chunk vectors for one root. With path=None the index is in-memory only
+    (e.g. for one-off documents); otherwise call flush() to persist changes.
+    On disk, meta.json names the current generation and matrix capacity; the
+    journal (journal.<generation>.jsonl) holds one line per page add or removal.
+    A journal line is only written once the vectors it points at are on disk.
+    """
+
+    def __init__(self, path=None, embedder=None):
+        self.path = path
+        self.embedder = embedder or _embedder
+        self.dim = self.embedder.dim
+        self.lock = threading.Lock()
+        self.rows = []  # Row -> {"url", "text", "last_scraped"}, or None once deleted
+        self.page_rows = {}  # url -> [rows]
+        self.page_hashes = {}  # url -> content_hash of the indexed version
+        self.count = 0
+        self.dead = 0
+        self.generation = 0
+        self._vectors = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._journal = []  # Entries not yet appended to the on-disk journal
+        if not (path and self._load()):
+            if path:
+                shutil.rmtree(path, ignore_errors=True)  # Stale files from another embedder
+            self._vectors = self._allocate(INITIAL_CAPACITY)
+            self._alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+            if path:
+                self._write_snapshot()
+
+    def __len__(self):
+        return self.count - self.dead
+
+    def _matrix_path(self, generation):
+        return os.path.join(self.path, f"vectors.{generation}.f32")
+
+    def _journal_path(self, generation):
+        return os.path.join(self.path, f"journal.{generation}.jsonl")
+
+    def _allocate(self, capacity, generation=None):
+        if not self.path:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+        os.makedirs(self.path, exist_ok=True)
+        return np.memmap(self._matrix_path(self.generation if generation is None else generation),
+                         dtype=np.float32, mode='w+', shape=(capacity, self.dim))
+
+    def _load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("format") != INDEX_FORMAT or meta["embedder"] != self.embedder.name or meta["dim"] != self.dim:
+                return False  # Different layout or embedding space; rebuild from scratch
+            self.generation = meta["generation"]
+            capacity = meta["capacity"]
+            self._vectors = np.memmap(self._matrix_path(self.generation), dtype=np.float32, mode='r+',
+                                      shape=(capacity, self.dim))
+            for entry in self._read_journal():
+                self._replay(entry)
+            if len(self.rows) > capacity:
+                raise ValueError("journal points past the end of the matrix")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Vector index at {self.path} unreadable, rebuilding: {e}")
+            self.rows, self.page_rows, self.page_hashes = [], {}, {}
+            return False
+        self.count = len(self.rows)
+        self.dead = sum(1 for entry in self.rows if entry is None)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:self.count] = [entry is not None for entry in self.rows]
+        return True
+
+    def _read_journal(self):
+        """Journal entries in order; a line torn by a crash mid-append is cut off."""
+        entries = []
+        path = self._journal_path(self.generation)
+        with open(path, 'rb+') as f:
+            good = 0
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                good += len(line)
+            f.truncate(good)
+        return entries
+
+    def _replay(self, entry):
+        for row in self.page_rows.pop(entry["url"], []):
+            self.rows[row] = None
+        self.page_hashes.pop(entry["url"], None)
+        if entry["op"] != "add":
+            return
+        start = entry["start"]
+        self.rows.extend([None] * (start + len(entry["texts"]) - len(self.rows)))
+        for offset, text in enumerate(entry["texts"]):
+            self.rows[start + offset] = {"url": entry["url"], "text": text, "last_scraped": entry["last_scraped"]}
+        self.page_rows[entry["url"]] = list(range(start, start + len(entry["texts"])))
+        self.page_hashes[entry["url"]] = entry["hash"]
+
+    def _write_snapshot(self):
+        """Start the current generation's journal from the whole index, then point meta.json at it."""
+        self._vectors.flush()
+        with open(self._journal_path(self.generation), 'w', encoding='utf-8') as f:
+            for url, rows in self.page_rows.items():
+                f.write(json.dumps(self._add_entry(url, rows)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal = []
+        meta = {
+            "format": INDEX_FORMAT,
+            "embedder": self.embedder.name,
+            "dim": self.dim,
+            "generation": self.generation,
+            "capacity": len(self._vectors)
+        }
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    def _add_entry(self, url, rows):
+        return {
+            "op": "add",
+            "url": url,
+            "hash": self.page_hashes.get(url),
+            "last_scraped": self.rows[rows[0]]["last_scraped"] if rows else None,
+            "start": rows[0] if rows else self.count,
+            "texts": [self.rows[row]["text"] for row in rows]
+        }
+
+    def _resize(self, capacity, keep_rows):
+        """Copy keep_rows (in order) into a fresh matrix of the given capacity."""
+        generation = self.generation + 1
+        vectors = self._allocate(capacity, generation)
+        for start in range(0, len(keep_rows), SEARCH_BLOCK_ROWS):
+            block = keep_rows[start:start + SEARCH_BLOCK_ROWS]
+            vectors[start:start + len(block)] = self._vectors[block]
+        old_generation = self.generation
+        self._vectors, self.generation = vectors, generation
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:len(keep_rows)] = True
+        if self.path:
+            # The new generation is complete on disk before meta.json switches to it
+            self._write_snapshot()
+            for old_path in (self._matrix_path(old_generation), self._journal_path(old_generation)):
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass  # Still mapped elsewhere (Windows); removed with the root
+
+    def _compact(self):
+        keep = [row for row, entry in enumerate(self.rows) if entry is not None]
+        self.rows = [self.rows[row] for row in keep]
+        self.page_rows = {}
+        for row, entry in enumerate(self.rows):
+            self.page_rows.setdefault(entry["url"], []).append(row)
+        self.count, self.dead = len(keep), 0
+        self._resize(max(INITIAL_CAPACITY, 2 * len(keep)), keep)
+
+    def remove_page(self, url):
+        if url not in self.page_rows and url not in self.page_hashes:
+            return
+        # Vectors stay in place (masked), so a crash before the next flush leaves the old page intact
+        for row in self.page_rows.pop(url, []):
+            self.rows[row] = None
+            self._alive[row] = False
+            self.dead += 1
+        self.page_hashes.pop(url, None)
+        if self.path:
+            self._journal.append({"op": "remove", "url": url})
+        if self.dead > INITIAL_CAPACITY and self.dead > COMPACT_DEAD_FRACTION * self.count:
+            self._compact()
+
+    def add_page(self, url, chunks, content_hash=None, last_scraped=None):
+        """Embed and index a page's chunks, replacing any earlier version of the page."""
+        self.remove_page(url)
+        chunks = [chunk for chunk in chunks if chunk]
+        capacity = len(self._alive)
+        if self.count + len(chunks) > capacity:
+            while capacity < self.count + len(chunks):
+                capacity *= 2
+            self._resize(capacity, list(range(self.count)))
+            for row, entry in enumerate(self.rows):
+                self._alive[row] = entry is not None
+        rows = []
+        for start in range(0, len(chunks), EMBED_BATCH):
+            batch = chunks[start:start + EMBED_BATCH]
+            first = self.count
+            self._vectors[first:first + len(batch)] = normalize(np.asarray(self.embedder(batch), dtype=np.float32))
+            self._alive[first:first + len(batch)] = True
+            for text in batch:
+                self.rows.append({"url": url, "text": text, "last_scraped": last_scraped})
+                rows.append(self.count)
+                self.count += 1
+        self.page_rows[url] = rows
+        self.page_hashes[url] = content_hash
+        if self.path:
+            self._journal.append(self._add_entry(url, rows))
+
+    def search(self, query, k=8):
+        """Top k (cosine, Hit) pairs for the query text, best first."""
+        if not len(self):
+            return []
+        q = normalize(np.asarray(self.embedder([query]), dtype=np.float32))[0]
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, self.count)
+            scores[start:end] = self._vectors[start:end] @ q
+        scores[~self._alive[:self.count]] = -np.inf
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        floor = max(0.0, getattr(self.embedder, 'min_similarity', 0.0))
+        return [(float(scores[row]), Hit(**self.rows[row])) for row in top if scores[row] > floor]
+
+    def flush(self):
+        """Persist changes since the last flush (no-op for in-memory indexes)."""
+        if not self.path or not self._journal:
+            return
+        self._vectors.flush()  # Vectors first: the journal must never name rows that aren't on disk
+        with open(self._journal_path(self.generation), 'a', encoding='utf-8') as f:
+            for entry in self._journal:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal = []
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def _root_path(root_url):
+    return os.path.join(VECTOR_DIR, hashlib.sha1(root_url.encode('utf-8')).hexdigest()[:16])
+
+def get_index(root_url):
+    """The persistent VectorIndex for a root (loaded from disk on first use)."""
+    with _indexes_lock:
+        index = _indexes.get(root_url)
+        if index is None:
+            index = _indexes[root_url] = VectorIndex(_root_path(root_url))
+        _indexes.move_to_end(root_url)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+def drop_index(root_url):
+    """Forget a root's vectors, on disk too."""
+    with _indexes_lock:
+        _indexes.pop(root_url, None)
+    shutil.rmtree(_root_path(root_url), ignore_errors=True)
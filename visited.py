@@ -0,0 +1,76 @@
+"""
+Compact visited set for very large crawls.
+Stores a 64-bit fingerprint per URL in an open-addressing array instead of the
+URL string itself: roughly 13-26 bytes per URL versus 150+ for a set of
+strings. Two distinct URLs collide with probability ~n^2 / 2^65 (about one in
+370,000 for a 10 million URL crawl), which at worst skips one page.
+Run benchmark_visited.py to compare memory use against a plain set.
+"""
+
+from array import array
+import hashlib
+
+MAX_LOAD = 0.6  # Grow the table beyond this fill ratio
+MIN_SLOTS = 16
+
+def fingerprint(url):
+    """64-bit fingerprint of a URL (never 0, which marks an empty slot)."""
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+class FingerprintSet:
+    """Set of URLs kept as 64-bit fingerprints; supports add, in and len like a set."""
+
+    def __init__(self, urls=None, capacity=1024):
+        size = MIN_SLOTS
+        while size * MAX_LOAD < capacity:
+            size <<= 1
+        self._slots = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._len = 0
+        for url in urls or []:
+            self.add(url)
+
+    def _index(self, fp):
+        """Slot holding fp, or the empty slot where it belongs (linear probing)."""
+        slots, mask = self._slots, self._mask
+        i = fp & mask
+        while True:
+            value = slots[i]
+            if value == 0 or value == fp:
+                return i
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self._slots
+        self._slots = array('Q', bytes(16 * len(old)))
+        self._mask = len(self._slots) - 1
+        for fp in old:
+            if fp:
+                self._slots[self._index(fp)] = fp
+
+    def add(self, url):
+        fp = fingerprint(url)
+        i = self._index(fp)
+        if self._slots[i] == fp:
+            return
+        self._slots[i] = fp
+        self._len += 1
+        if self._len > len(self._slots) * MAX_LOAD:
+            self._grow()
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url):
+        fp = fingerprint(url)
+        return self._slots[self._index(fp)] == fp
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def nbytes(self):
+        """Bytes used by the fingerprint table."""
+        return self._slots.itemsize * len(self._slots)
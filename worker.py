@@ -0,0 +1,132 @@
+"""
+Standalone crawl worker.
+Drains the crawl_tasks queue in monitor.db: each task is one URL, leased
+atomically so any number of worker processes (on this machine, or on others
+sharing the database file) can run side by side. Start app.py with
+CRAWL_MODE=queue so the dashboard and scheduler only enqueue.
+
+    python worker.py --processes 4
+
+The OpenAI key for summaries comes from the OPENAI_API_KEY environment variable.
+Politeness limits are per process, so N workers may contact one host up to N
+times as often as a single crawl would.
+"""
+
+import argparse
+import datetime
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+import storage
+import crawl_engine
+import llm_pipeline
+import master_summary
+import change_analysis
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+POLL_INTERVAL = 2  # Seconds to sleep when the queue is empty
+
+@crawl_engine.llm_stage
+def summarize(page):
+    # Unchanged pages keep their summary; mirrors are served from the summary cache
+    previous = storage.get_reusable_summary(page.url, page.content_hash, page.simhash, len(page.text.split()))
+    if previous is not None:
+        page.data['summary'] = previous
+        return
+    page.data['summary'] = llm_pipeline.summarize(page.text, OPENAI_API_KEY, content_hash=page.content_hash)
+
+def save(page):
+    changed = storage.save_page(page.url, page.content_hash, page.data['summary'], page.text, root_url=page.root_url,
+                                simhash=page.simhash)
+    storage.log_scrape_run(page.root_url, page.url, page.started_at, datetime.datetime.now().isoformat(), "success", page.bytes_fetched, changed)
+
+def run_task(task, worker_id):
+    """Fetch, extract, summarize and save one URL, then report the outcome to the queue."""
+    root_url = task['root_url']
+    outcome = {}
+
+    def log_failure(page):
+        outcome['error'] = "fetch failed"
+        storage.log_scrape_run(root_url, page.url, page.started_at, datetime.datetime.now().isoformat(), "failed", 0, False)
+
+    def log_skip(url, status):
+        outcome['skipped'] = status
+        now = datetime.datetime.now().isoformat()
+        storage.log_scrape_run(root_url, url, now, now, status, 0, False)
+
+    engine = crawl_engine.CrawlEngine(
+        root_url,
+        stages=[summarize, save],
+        render_js=True if task['capture_screenshots'] else 'auto',
+        save_screenshot=bool(task['capture_screenshots']),
+        check_circuit=True,
+        respect_robots=True,
+        volatile_patterns=storage.get_volatile_patterns(root_url),
+        on_failure=log_failure,
+        on_skip=log_skip
+    )
+    try:
+        page = engine.process(task['url'], task['depth'])
+    except Exception as e:
+        traceback.print_exc()
+        if storage.fail_task(task['id'], worker_id, str(e)) is None:
+            print(f"Lease on {task['url']} was lost; result discarded")
+        return
+
+    if page is not None:
+        recorded = storage.complete_task(task['id'], worker_id, page.links)
+        change_analysis.process_pending(OPENAI_API_KEY, root_url=root_url)
+    elif outcome.get('skipped') == "skipped: robots.txt":
+        recorded = storage.complete_task(task['id'], worker_id)
+    else:
+        # Fetch failures and open circuits are retried later
+        status = storage.fail_task(task['id'], worker_id, outcome.get('error') or outcome.get('skipped') or "no content")
+        recorded = status is not None
+        if recorded:
+            print(f"Task {task['url']} {'failed' if status == 'failed' else 'will be retried'}")
+    if not recorded:
+        # The lease expired and another worker owns the task now
+        print(f"Lease on {task['url']} was lost; result discarded")
+        return
+
+    # Only the worker whose update finalizes the crawl rebuilds the master summary
+    if storage.finish_crawl(task['crawl_id']):
+        print(f"Crawl finished for {root_url}")
+        master_summary.update_master_summary(root_url, OPENAI_API_KEY)
+
+def run_worker(once=False, poll_interval=POLL_INTERVAL):
+    """Claim and run tasks until stopped (or until the queue is empty with once=True)."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {worker_id} started")
+    while True:
+        task = storage.claim_task(worker_id)
+        if task is None:
+            if once and not storage.get_queue_stats()["active_crawls"]:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_task(task, worker_id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl worker draining the shared task queue")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="Seconds between polls of an empty queue")
+    args = parser.parse_args()
+
+    storage.init_db()
+    if args.processes <= 1:
+        run_worker(args.once, args.poll)
+        return
+
+    processes = [multiprocessing.Process(target=run_worker, args=(args.once, args.poll))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()